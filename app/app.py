@@ -7,13 +7,19 @@ A Streamlit dashboard that queries sensor data from DynamoDB and displays intera
 
 import streamlit as st
 import pandas as pd
+import numpy as np
 import altair as alt
+import pyarrow as pa
 import boto3
 import datetime
 import os
 import logging
-import time
 import hashlib
+import hmac
+import itertools
+from concurrent.futures import ThreadPoolExecutor
+from botocore.config import Config
+from boto3.dynamodb.types import TypeDeserializer
 from streamlit_autorefresh import st_autorefresh
 from dotenv import load_dotenv
 
@@ -25,23 +31,37 @@ logger = logging.getLogger("EMSDashboard")
 # Load environment variables
 load_dotenv()
 
+# Failed logins allowed per session before the login form is locked
+MAX_LOGIN_ATTEMPTS = int(os.getenv("DASHBOARD_MAX_LOGIN_ATTEMPTS", "5"))
+
+@st.cache_resource
+def get_login_credentials():
+    """Resolve the dashboard username and password hash once per process instead of every rerun."""
+    # Get username/password from environment variables with defaults
+    correct_username = os.getenv("DASHBOARD_USERNAME", "admin")
+    # Use a hashed version of the password; a variable that is set but empty matches no password
+    correct_password_hash = os.getenv("DASHBOARD_PASSWORD_HASH", hashlib.sha256(b"admin").hexdigest())
+    return correct_username, correct_password_hash
+
 # Basic authentication function
 def check_password():
     """Returns `True` if the user had the correct password."""
-    # Get username/password from environment variables with defaults
-    correct_username = os.getenv("DASHBOARD_USERNAME", "admin")
-    # Use a hashed version of the password
-    correct_password_hash = os.getenv("DASHBOARD_PASSWORD_HASH", 
-                                     hashlib.sha256("admin".encode()).hexdigest())
-    
-    def validate_credentials(username, password):
-        return (username == correct_username and 
-                hashlib.sha256(password.encode()).hexdigest() == correct_password_hash)
-    
-    # If already authenticated, don't show login again
+    # If already authenticated, don't show login again or touch the credentials
     if st.session_state.get("authenticated", False):
         return True
+    
+    correct_username, correct_password_hash = get_login_credentials()
+    
+    def validate_credentials(username, password):
+        # Constant-time comparisons, combined with & so both are always evaluated
+        return (hmac.compare_digest(username.encode(), correct_username.encode()) &
+                hmac.compare_digest(hashlib.sha256(password.encode()).hexdigest(), correct_password_hash))
 
+    # Sessions that exceeded the allowed failures are rejected without showing the form
+    if st.session_state.get("fail_count", 0) >= MAX_LOGIN_ATTEMPTS:
+        st.error("Too many failed login attempts")
+        st.stop()
+    
     # Show login form
     st.markdown("### Dashboard Login")
     username = st.text_input("Username")
@@ -52,9 +72,12 @@ def check_password():
             st.session_state["authenticated"] = True
             return True
         else:
+            # Count failures per session instead of sleeping, which would block the worker thread
+            st.session_state["fail_count"] = st.session_state.get("fail_count", 0) + 1
+            if st.session_state["fail_count"] >= MAX_LOGIN_ATTEMPTS:
+                st.error("Too many failed login attempts")
+                st.stop()
             st.error("Invalid username or password")
-            # Add delay to prevent brute force attacks
-            time.sleep(1)
             return False
     return False
 
@@ -80,132 +103,581 @@ if st.session_state.get("authenticated", False):
 # ----- AWS Configuration -----
 AWS_REGION = os.getenv("AWS_REGION", "us-east-1")
 DYNAMODB_TABLE = os.getenv("DYNAMODB_TABLE", "sensor_data")
+# Hourly rollups maintained by the stream Lambda (terraform/hourly_rollup.tf)
+DYNAMODB_HOURLY_TABLE = os.getenv("DYNAMODB_HOURLY_TABLE", "sensor_data_hourly")
+USE_HOURLY_ROLLUPS = os.getenv("DASHBOARD_USE_HOURLY_ROLLUPS", "true").lower() == "true"
+# sensor_type partition keys queried when no sensor type is selected: the IoT rule writes
+# topic(1) ("ems") for readings and "error" from its error action (terraform/stream_analytics.tf)
+SENSOR_PARTITIONS = [p.strip() for p in os.getenv("DASHBOARD_PARTITIONS", "ems,error").split(",") if p.strip()]
+# Attributes read for each reading (empty = all); the Device Details tab fetches full items on demand
+PROJECTED_ATTRIBUTES = [a.strip() for a in os.getenv(
+    "DASHBOARD_ATTRIBUTES", "edge_time_stamp,device_id,sensor_type,building_total_energy_kwh,building_demand_kw"
+).split(",") if a.strip()]
+# Number of parallel segments used when a full table scan is needed
+SCAN_SEGMENTS = int(os.getenv("SCAN_SEGMENTS", "8"))
+# Maximum number of points per line series sent to the browser
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "2000"))
 
-# ----- Function to query DynamoDB for sensor data -----
-@st.cache_data(ttl=60)
-def fetch_sensor_data(table_name, region_name, start_date=None, end_date=None, device_id=None, sensor_type=None):
+def date_range_bounds(start_date, end_date):
     """
-    Query sensor data from DynamoDB with optional filters.
-    Uses efficient Query operations with GSIs for better performance.
+    Convert a date range into edge_time_stamp sort key bounds.
+    Bare ISO dates sort before both 'YYYY-MM-DD HH:MM:SS' and 'YYYY-MM-DDTHH:MM:SS'
+    timestamps, so the bounds cover start_date through the end of end_date
+    whichever separator the publisher used.
     """
-    try:
-        # Initialize DynamoDB resource (ensure proper IAM role or credentials are set)
-        dynamodb = boto3.resource('dynamodb', region_name=region_name)
-        table = dynamodb.Table(table_name)
-        
-        logger.info(f"Fetching data from DynamoDB table: {table_name}")
-        
-        items = []
+    start_ts = start_date.isoformat()
+    end_ts = (end_date + datetime.timedelta(days=1)).isoformat()
+    return start_ts, end_ts
+
+def projection_params():
+    """
+    Build ProjectionExpression parameters for PROJECTED_ATTRIBUTES.
+    Every attribute goes through a name placeholder so reserved words are safe.
+    """
+    if not PROJECTED_ATTRIBUTES:
+        return {}
+    names = {f"#p{i}": attribute for i, attribute in enumerate(PROJECTED_ATTRIBUTES)}
+    return {'ProjectionExpression': ", ".join(names), 'ExpressionAttributeNames': names}
+
+def key_condition_params(partition_key, partition_value, sort_key=None, sort_range=None, index_name=None,
+                         project=True):
+    """
+    Build low-level query parameters for an equality match on the partition key,
+    optionally bounded to sort_range (inclusive) on sort_key.
+    With project=True the query only reads PROJECTED_ATTRIBUTES.
+    """
+    params = projection_params() if project else {}
+    names = {**params.get('ExpressionAttributeNames', {}), '#pk': partition_key}
+    values = {':pk': {'S': partition_value}}
+    expression = "#pk = :pk"
+    if sort_range:
+        names['#sk'] = sort_key
+        values[':lo'], values[':hi'] = {'S': sort_range[0]}, {'S': sort_range[1]}
+        expression += " AND #sk BETWEEN :lo AND :hi"
+    
+    params.update({
+        'KeyConditionExpression': expression,
+        'ExpressionAttributeNames': names,
+        'ExpressionAttributeValues': values
+    })
+    if index_name:
+        params['IndexName'] = index_name
+    return params
+
+def paginate(operation, params):
+    """Call a DynamoDB query/scan operation and yield items from every result page."""
+    response = operation(**params)
+    yield from response.get('Items', [])
+    
+    while 'LastEvaluatedKey' in response:
+        logger.info("Fetching additional page of results")
+        params['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        response = operation(**params)
+        yield from response.get('Items', [])
+
+class FloatTypeDeserializer(TypeDeserializer):
+    """
+    TypeDeserializer that returns DynamoDB numbers as int or float instead of Decimal,
+    so numeric columns reach pandas as native floats without a conversion pass.
+    """
+    
+    def _deserialize_n(self, value):
+        """Deserialize a number attribute as int when integral, float otherwise."""
+        try:
+            return int(value)
+        except ValueError:
+            return float(value)
+
+DESERIALIZER = FloatTypeDeserializer()
+
+def deserialize_items(items):
+    """Convert low-level DynamoDB items into plain Python dicts."""
+    for item in items:
+        yield {key: DESERIALIZER.deserialize(value) for key, value in item.items()}
+
+@st.cache_resource
+def get_ddb_client(region_name):
+    """Return a low-level DynamoDB client whose connection pool can serve every scan segment."""
+    return boto3.client(
+        'dynamodb',
+        region_name=region_name,
+        config=Config(max_pool_connections=max(32, SCAN_SEGMENTS))
+    )
+
+def parallel_scan(table_name, region_name, segments=SCAN_SEGMENTS, scan_params=None):
+    """
+    Scan a table as parallel segments with the low-level DynamoDB client.
+    Each segment is paginated in its own worker thread; boto3 releases the GIL
+    while waiting on the network, so wall-clock time drops roughly 1/segments.
+    scan_params defaults to projection_params().
+    """
+    client = get_ddb_client(region_name)
+    if scan_params is None:
+        scan_params = projection_params()
+    
+    def scan_segment(segment):
+        params = {'TableName': table_name, 'TotalSegments': segments, 'Segment': segment, **scan_params}
+        return list(paginate(client.scan, params))
+    
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        segment_items = list(executor.map(scan_segment, range(segments)))
+    
+    # Deserialize lazily so each segment's raw items can be released once consumed
+    while segment_items:
+        yield from deserialize_items(segment_items.pop())
+
+def items_to_frame(items):
+    """
+    Build a DataFrame column by column from an iterable of DynamoDB items.
+    Items are consumed one at a time, so generators over result pages never
+    hold the full result set as a list of dicts alongside the frame.
+    The frame is assembled through Arrow instead of per-row dict inference.
+    Attributes missing from an item are filled with None.
+    """
+    columns = {}
+    for row, item in enumerate(items):
+        for key, value in item.items():
+            column = columns.get(key)
+            if column is None:
+                column = columns[key] = [None] * row
+            column.append(value)
         
-        # If we have a device_id filter, use the GSI
-        if device_id and not sensor_type:
-            logger.info(f"Querying GSI by device_id: {device_id}")
-            
-            query_params = {
-                'IndexName': 'DeviceIdIndex',
-                'KeyConditionExpression': boto3.dynamodb.conditions.Key('device_id').eq(device_id)
-            }
-            
-            if start_date and end_date:
-                # Convert dates to ISO format string to match DynamoDB format
-                start_ts = datetime.datetime.combine(start_date, datetime.time.min).isoformat()
-                end_ts = datetime.datetime.combine(end_date, datetime.time.max).isoformat()
-                
-                query_params['KeyConditionExpression'] = (
-                    query_params['KeyConditionExpression'] & 
-                    boto3.dynamodb.conditions.Key('edge_time_stamp').between(start_ts, end_ts)
-                )
-            
-            response = table.query(**query_params)
-            items.extend(response.get('Items', []))
-            
-            while 'LastEvaluatedKey' in response:
-                logger.info("Fetching additional page of query results")
-                query_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
-                response = table.query(**query_params)
-                items.extend(response.get('Items', []))
+        # Pad columns this item doesn't carry so every column stays row-aligned
+        if len(item) < len(columns):
+            for column in columns.values():
+                if len(column) == row:
+                    column.append(None)
+    
+    try:
+        return pa.table(columns).to_pandas()
+    except pa.ArrowException:
+        # Columns with mixed value types can't be typed by Arrow
+        logger.warning("Falling back to pandas DataFrame construction for mixed-type columns")
+        return pd.DataFrame(columns)
+
+def downsample_lttb(df, x_col, y_col, n_out=CHART_MAX_POINTS):
+    """
+    Reduce a time-ordered series to n_out rows with Largest-Triangle-Three-Buckets.
+    Keeps the visual shape of the line while bounding the data embedded in the chart.
+    """
+    df = df.dropna(subset=[y_col])
+    n = len(df)
+    if n <= n_out or n_out < 3:
+        return df
+    
+    x = df[x_col].values.astype('int64').astype('float64')
+    y = df[y_col].values.astype('float64')
+    
+    # First and last points are always kept; the rest is split into n_out - 2 buckets
+    edges = (np.arange(n_out - 1) * ((n - 2) / (n_out - 2))).astype('int64') + 1
+    edges[-1] = n - 1
+    selected = np.empty(n_out, dtype='int64')
+    selected[0], selected[-1] = 0, n - 1
+    
+    a = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
         
-        # If we have a sensor_type filter, use the primary key
-        elif sensor_type and not device_id:
-            logger.info(f"Querying by sensor_type: {sensor_type}")
-            
-            query_params = {
-                'KeyConditionExpression': boto3.dynamodb.conditions.Key('sensor_type').eq(sensor_type)
-            }
-            
-            if start_date and end_date:
-                # Convert dates to ISO format string to match DynamoDB format
-                start_ts = datetime.datetime.combine(start_date, datetime.time.min).isoformat()
-                end_ts = datetime.datetime.combine(end_date, datetime.time.max).isoformat()
-                
-                query_params['KeyConditionExpression'] = (
-                    query_params['KeyConditionExpression'] & 
-                    boto3.dynamodb.conditions.Key('edge_time_stamp').between(start_ts, end_ts)
-                )
-            
-            response = table.query(**query_params)
-            items.extend(response.get('Items', []))
-            
-            while 'LastEvaluatedKey' in response:
-                logger.info("Fetching additional page of query results")
-                query_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
-                response = table.query(**query_params)
-                items.extend(response.get('Items', []))
+        # Average of the next bucket (or the last point) is the third triangle vertex
+        if i + 2 < len(edges):
+            next_x = x[end:edges[i + 2]].mean()
+            next_y = y[end:edges[i + 2]].mean()
+        else:
+            next_x, next_y = x[-1], y[-1]
         
-        # If we have both or neither, fall back to scan with FilterExpression
+        # Pick the point in this bucket forming the largest triangle with a and the next average
+        areas = np.abs((x[a] - next_x) * (y[start:end] - y[a]) -
+                       (x[a] - x[start:end]) * (next_y - y[a]))
+        a = start + int(areas.argmax())
+        selected[i + 1] = a
+    
+    return df.iloc[selected]
+
+def parallel_query(table_name, region_name, partitions, sort_key, sort_range, project=True, device_id=None):
+    """
+    Query each sensor_type partition over sort_range on sort_key, one worker thread per
+    partition, so only the selected window is read. device_id, when given, is applied as
+    a filter on the partition's items.
+    """
+    client = get_ddb_client(region_name)
+    
+    def query_partition(partition):
+        params = key_condition_params('sensor_type', partition, sort_key, sort_range, project=project)
+        params['TableName'] = table_name
+        if device_id:
+            params['FilterExpression'] = "#fd = :fd"
+            params['ExpressionAttributeNames']['#fd'] = 'device_id'
+            params['ExpressionAttributeValues'][':fd'] = {'S': device_id}
+        return list(paginate(client.query, params))
+    
+    with ThreadPoolExecutor(max_workers=max(1, len(partitions))) as executor:
+        partition_items = list(executor.map(query_partition, partitions))
+    
+    while partition_items:
+        yield from deserialize_items(partition_items.pop())
+
+# ----- Function to query DynamoDB for sensor data -----
+# Bounded so every (table, region, date range) combination can't grow memory indefinitely
+@st.cache_data(ttl=60, max_entries=128, show_spinner="Fetching sensor data...")
+def fetch_sensor_data(table_name, region_name, start_date=None, end_date=None, device_id=None, sensor_type=None,
+                      aggregation=None):
+    """
+    Query sensor data from DynamoDB with optional filters.
+    The date range is applied as a key condition on edge_time_stamp, querying the
+    selected sensor_type partition, DeviceIdIndex for a device_id, or every partition
+    in SENSOR_PARTITIONS in parallel, so only the selected window is read.
+    The table is only scanned when neither a date range nor a sensor type is given.
+    With aggregation='hourly', table_name is the hourly rollup table and its
+    per-hour sums and counts are returned instead of raw readings.
+    DynamoDB errors are raised rather than returned as an empty frame so that
+    transient failures (throttling, IAM) are never cached.
+    """
+    # Reuse the cached DynamoDB client (ensure proper IAM role or credentials are set)
+    client = get_ddb_client(region_name)
+    
+    logger.info(f"Fetching data from DynamoDB table: {table_name}")
+    
+    # Item sources are consumed lazily, page by page, straight into the frame's columns
+    sources = []
+    time_range = date_range_bounds(start_date, end_date) if start_date and end_date else None
+    
+    partitions = [sensor_type] if sensor_type else SENSOR_PARTITIONS
+    
+    # Hourly rollups share the sensor_type partitions, keyed by hour_bucket
+    if aggregation == 'hourly':
+        if sensor_type or time_range:
+            sources.append(parallel_query(table_name, region_name, partitions, 'hour_bucket', time_range,
+                                          project=False))
         else:
-            logger.info("Using scan with filter expressions")
-            scan_params = {}
-            filter_expressions = []
-            
-            if device_id:
-                filter_expressions.append(boto3.dynamodb.conditions.Attr('device_id').eq(device_id))
-            
-            if sensor_type:
-                filter_expressions.append(boto3.dynamodb.conditions.Attr('sensor_type').eq(sensor_type))
-            
-            if start_date and end_date:
-                # Convert dates to ISO format string
-                start_ts = datetime.datetime.combine(start_date, datetime.time.min).isoformat()
-                end_ts = datetime.datetime.combine(end_date, datetime.time.max).isoformat()
-                filter_expressions.append(
-                    boto3.dynamodb.conditions.Attr('edge_time_stamp').between(start_ts, end_ts)
-                )
-            
-            # Combine filter expressions if we have any
-            if filter_expressions:
-                combined_filter = filter_expressions[0]
-                for expr in filter_expressions[1:]:
-                    combined_filter = combined_filter & expr
-                scan_params['FilterExpression'] = combined_filter
-            
-            response = table.scan(**scan_params)
-            items.extend(response.get("Items", []))
-            
-            # Paginate through results if necessary
-            while 'LastEvaluatedKey' in response:
-                logger.info("Fetching additional page of scan results")
-                scan_params['ExclusiveStartKey'] = response['LastEvaluatedKey']
-                response = table.scan(**scan_params)
-                items.extend(response.get("Items", []))
+            sources.append(parallel_scan(table_name, region_name, scan_params={}))
         
-        if not items:
-            logger.warning("No items found in DynamoDB table")
+        df = items_to_frame(itertools.chain.from_iterable(sources))
+        if df.empty:
+            logger.warning("No hourly rollups found in DynamoDB table")
             return pd.DataFrame()
-            
-        df = pd.DataFrame(items)
         
-        # Convert timestamp string to datetime if available
-        if "edge_time_stamp" in df.columns:
-            df['timestamp'] = pd.to_datetime(df['edge_time_stamp'])
-            
-        logger.info(f"Retrieved {len(df)} records from DynamoDB")
+        df['hour'] = pd.to_datetime(df['hour_bucket'], format="%Y-%m-%dT%H")
+        logger.info(f"Retrieved {len(df)} hourly rollups from DynamoDB")
         return df
+    
+    # If we have a device_id filter, use the GSI
+    if device_id and not sensor_type:
+        logger.info(f"Querying GSI by device_id: {device_id}")
         
-    except Exception as e:
-        logger.error(f"Error fetching data from DynamoDB: {str(e)}")
-        st.error(f"Error fetching data from DynamoDB: {str(e)}")
+        query_params = key_condition_params('device_id', device_id, 'edge_time_stamp', time_range,
+                                            index_name='DeviceIdIndex')
+        query_params['TableName'] = table_name
+        sources.append(deserialize_items(paginate(client.query, query_params)))
+    
+    # Otherwise query each sensor_type partition over the selected window
+    elif sensor_type or time_range:
+        logger.info(f"Querying sensor_type partitions: {', '.join(partitions)}")
+        sources.append(parallel_query(table_name, region_name, partitions, 'edge_time_stamp', time_range,
+                                      device_id=device_id))
+    
+    # No date range to bound the read, fall back to a full scan
+    else:
+        logger.info(f"No date range given, scanning the full table in {SCAN_SEGMENTS} segments")
+        sources.append(parallel_scan(table_name, region_name))
+    
+    df = items_to_frame(itertools.chain.from_iterable(sources))
+    if df.empty:
+        logger.warning("No items found in DynamoDB table")
         return pd.DataFrame()
+    
+    # Convert timestamp string to datetime if available
+    if "edge_time_stamp" in df.columns:
+        df['timestamp'] = pd.to_datetime(df['edge_time_stamp'])
+        
+        # Derive the hourly buckets once per cache generation instead of per tab and rerun;
+        # truncating to datetime64[h] works on the int64 buffer directly
+        df['hour'] = df['timestamp'].values.astype('datetime64[h]')
+        df['hour_of_day'] = df['timestamp'].dt.hour.astype('int8')
+    
+    # Low-cardinality keys as categoricals so filters and groupbys work on integer codes;
+    # the inferred categories are already sorted, which the sidebar lists rely on
+    for column in ('device_id', 'sensor_type'):
+        if column in df.columns:
+            df[column] = df[column].astype('category')
+        
+    logger.info(f"Retrieved {len(df)} records from DynamoDB")
+    return df
+
+@st.cache_data(ttl=60, max_entries=32)
+def fetch_full_reading(table_name, region_name, sensor_type, edge_time_stamp):
+    """Fetch every attribute of a single reading, for detail views of projected data."""
+    response = get_ddb_client(region_name).get_item(
+        TableName=table_name,
+        Key={'sensor_type': {'S': sensor_type}, 'edge_time_stamp': {'S': edge_time_stamp}}
+    )
+    item = response.get('Item')
+    return {key: DESERIALIZER.deserialize(value) for key, value in item.items()} if item else None
+
+def aggregate_hourly(df):
+    """
+    Aggregate raw readings per hour and sensor type in a single groupby pass.
+    The result has the same record_count / *_sum / *_count columns as the hourly
+    rollup table, so every tab derives its views from it with rollup_means.
+    """
+    if "hour" not in df.columns:
+        return pd.DataFrame()
+    
+    keys = ['hour', 'sensor_type'] if "sensor_type" in df.columns else ['hour']
+    aggregations = {'record_count': ('hour', 'size')}
+    for prefix, field in (("kwh", 'building_total_energy_kwh'), ("kw", 'building_demand_kw')):
+        if field in df.columns:
+            aggregations[f"{prefix}_sum"] = (field, 'sum')
+            aggregations[f"{prefix}_count"] = (field, 'count')
+    return df.groupby(keys, observed=True).agg(**aggregations).reset_index()
+
+def rollups_cover(rollups, hourly_agg):
+    """
+    Check that stored rollups carry both energy metrics and account for every raw
+    reading in hourly_agg, hour by hour. Hours from before the rollup Lambda was
+    deployed, or with records it failed to apply, are missing or short in the rollups.
+    """
+    if not {"kwh_sum", "kw_sum", "record_count"}.issubset(rollups.columns) or hourly_agg.empty:
+        return False
+    raw_counts = hourly_agg.groupby('hour')['record_count'].sum()
+    rollup_counts = rollups.groupby('hour')['record_count'].sum().reindex(raw_counts.index, fill_value=0)
+    return bool((rollup_counts >= raw_counts).all())
+
+def rollup_means(rollups, prefix, value_name, by='hour'):
+    """Combine hourly rollup sums and counts into an average per `by` group."""
+    totals = rollups.groupby(by)[[f"{prefix}_sum", f"{prefix}_count"]].sum()
+    means = (totals[f"{prefix}_sum"] / totals[f"{prefix}_count"]).rename(value_name)
+    return means.dropna().reset_index()
+
+# ----- Chart builders -----
+# Each builder returns the Vega-Lite spec dict and is cached on the chart data,
+# so reruns with unchanged data skip Altair's spec generation entirely.
+# The data is embedded inline in the spec, so it is only ever sent to logged-in sessions.
+@st.cache_data(ttl=60)
+def build_activity_chart(activity_df):
+    """Line chart of record counts per hour for each sensor type."""
+    return alt.Chart(activity_df).mark_line().encode(
+        x=alt.X('hour:T', title="Time"),
+        y=alt.Y('count:Q', title="Number of Records"),
+        color=alt.Color('sensor_type:N', title="Sensor Type"),
+        tooltip=['hour:T', 'sensor_type:N', 'count:Q']
+    ).properties(
+        width=700, 
+        height=300,
+        title="Sensor Activity by Hour"
+    ).interactive().to_dict()
+
+@st.cache_data(ttl=60)
+def build_energy_chart(energy_hourly):
+    """Line chart of hourly average building energy consumption."""
+    return alt.Chart(energy_hourly).mark_line().encode(
+        x=alt.X('hour:T', title="Time"),
+        y=alt.Y('building_total_energy_kwh:Q', title="Total Energy (kWh)"),
+        tooltip=['hour:T', 'building_total_energy_kwh:Q']
+    ).properties(
+        width=700, 
+        height=300, 
+        title="Total Energy Consumption (Hourly Average)"
+    ).interactive().to_dict()
+
+@st.cache_data(ttl=60)
+def build_pattern_chart(hourly_pattern):
+    """Bar chart of average energy usage by hour of day."""
+    return alt.Chart(hourly_pattern).mark_bar().encode(
+        x=alt.X('hour_of_day:O', title="Hour of Day"),
+        y=alt.Y('building_total_energy_kwh:Q', title="Avg Energy (kWh)"),
+        tooltip=['hour_of_day:O', 'building_total_energy_kwh:Q']
+    ).properties(
+        width=700, 
+        height=300, 
+        title="Average Energy Usage by Hour of Day"
+    ).to_dict()
+
+@st.cache_data(ttl=60)
+def build_demand_chart(demand_hourly):
+    """Line chart of hourly average building demand."""
+    return alt.Chart(demand_hourly).mark_line(color="red").encode(
+        x=alt.X('hour:T', title="Time"),
+        y=alt.Y('building_demand_kw:Q', title="Demand (kW)"),
+        tooltip=['hour:T', 'building_demand_kw:Q']
+    ).properties(
+        width=700, 
+        height=300, 
+        title="Building Demand (Hourly Average)"
+    ).interactive().to_dict()
+
+@st.cache_data(ttl=60)
+def build_timeline_chart(timeline_df):
+    """Bar chart of messages per hour for a single device."""
+    return alt.Chart(timeline_df).mark_bar().encode(
+        x=alt.X('hour:T', title="Time"),
+        y=alt.Y('messages:Q', title="Messages"),
+        tooltip=['hour:T', 'messages:Q']
+    ).properties(
+        width=700, 
+        height=200, 
+        title="Message Activity Over Time"
+    ).to_dict()
+
+# ----- Dashboard tabs -----
+# Each tab renders as a fragment, so its widgets rerun only that tab instead of the whole script.
+@st.fragment
+def overview_fragment(df, hourly_agg):
+    """Overview tab: KPI cards and hourly sensor activity."""
+    st.header("System Overview")
+    
+    # KPI Metrics Cards
+    metrics = {}
+    if "building_total_energy_kwh" in df.columns:
+        metrics["Avg Total Energy (kWh)"] = round(df["building_total_energy_kwh"].mean(), 2)
+    if "building_demand_kw" in df.columns:
+        metrics["Avg Demand (kW)"] = round(df["building_demand_kw"].mean(), 2)
+    
+    # Always show record count
+    metrics["Total Records"] = len(df)
+    
+    # Create metric columns dynamically based on available metrics
+    num_metrics = len(metrics)
+    if num_metrics > 0:
+        metric_cols = st.columns(num_metrics)
+        for i, (label, value) in enumerate(metrics.items()):
+            with metric_cols[i]:
+                st.metric(label, value)
+    
+    # Summary visualization
+    if not df.empty and "timestamp" in df.columns:
+        st.subheader("Recent Activity")
+        
+        # Group by hour and sensor_type if available
+        if "sensor_type" in df.columns:
+            # Timeseries of record counts by sensor type, straight from the hourly aggregate
+            activity_df = hourly_agg[['hour', 'sensor_type', 'record_count']].rename(columns={'record_count': 'count'})
+            st.vega_lite_chart(build_activity_chart(activity_df), use_container_width=True)
+
+@st.fragment
+def energy_fragment(df, hourly_rollups):
+    """Energy Analysis tab: hourly energy, usage pattern and demand charts."""
+    st.header("Energy Analysis")
+    
+    # ----- Visualization: Building Total Energy Consumption -----
+    if "building_total_energy_kwh" in df.columns:
+        st.subheader("Building Total Energy Consumption")
+        
+        # Aggregate data by hour for smoother visualization
+        energy_hourly = rollup_means(hourly_rollups, "kwh", 'building_total_energy_kwh')
+        energy_hourly = downsample_lttb(energy_hourly, 'hour', 'building_total_energy_kwh')
+        st.vega_lite_chart(build_energy_chart(energy_hourly), use_container_width=True)
+        
+        # Show daily energy usage pattern if enough data
+        if len(df) > 24:
+            st.subheader("Daily Energy Usage Pattern")
+            hourly_pattern = rollup_means(hourly_rollups.assign(hour_of_day=hourly_rollups['hour'].dt.hour),
+                                          "kwh", 'building_total_energy_kwh', by='hour_of_day')
+            st.vega_lite_chart(build_pattern_chart(hourly_pattern), use_container_width=True)
+    else:
+        st.warning("Field 'building_total_energy_kwh' not found in the data.")
+    
+    # ----- Visualization: Building Demand -----
+    if "building_demand_kw" in df.columns:
+        st.subheader("Building Demand")
+        
+        # Aggregate by hour
+        demand_hourly = rollup_means(hourly_rollups, "kw", 'building_demand_kw')
+        demand_hourly = downsample_lttb(demand_hourly, 'hour', 'building_demand_kw')
+        st.vega_lite_chart(build_demand_chart(demand_hourly), use_container_width=True)
+    else:
+        st.warning("Field 'building_demand_kw' not found in the data.")
+
+@st.fragment
+def device_fragment(df, table_name, region_name):
+    """Device Details tab: per-device metadata, latest reading and activity timeline."""
+    st.header("Device Details")
+    
+    if "device_id" in df.columns:
+        # Device selector
+        device_list = list(df["device_id"].cat.remove_unused_categories().cat.categories)
+        if device_list:
+            selected_device = st.selectbox("Select a Device", device_list)
+            device_df = df[df["device_id"] == selected_device]
+            
+            # Device metadata and stats
+            st.subheader(f"Device: {selected_device}")
+            
+            # Show all sensor types for this device
+            if "sensor_type" in device_df.columns:
+                st.write("Sensor Types:", ", ".join(sorted(device_df["sensor_type"].unique())))
+            
+            # Display last received data
+            if not device_df.empty:
+                st.write("Last data received:", device_df["timestamp"].max())
+                
+                # Display latest record details
+                latest_record = device_df.sort_values("timestamp", ascending=False).iloc[0].to_dict()
+                
+                # The bulk fetch only projects the charted attributes, so load the full item
+                if PROJECTED_ATTRIBUTES:
+                    try:
+                        full_record = fetch_full_reading(table_name, region_name,
+                                                         str(latest_record["sensor_type"]),
+                                                         latest_record["edge_time_stamp"])
+                        if full_record:
+                            latest_record = full_record
+                    except Exception as e:
+                        logger.warning(f"Could not fetch full latest reading: {str(e)}")
+                st.subheader("Latest Reading")
+                
+                # Render every field in one table instead of one message per field
+                display_record = {key: str(value) for key, value in latest_record.items()
+                                  if key not in ("timestamp", "hour", "hour_of_day")}
+                st.dataframe(pd.Series(display_record, name="value").to_frame(), use_container_width=True)
+                            
+                # Device activity timeline
+                st.subheader("Device Activity Timeline")
+                timeline_df = device_df.groupby('hour').size().reset_index(name='messages')
+                timeline_df = downsample_lttb(timeline_df, 'hour', 'messages')
+                st.vega_lite_chart(build_timeline_chart(timeline_df), use_container_width=True)
+            else:
+                st.warning(f"No data available for device {selected_device}")
+        else:
+            st.warning("No device data available")
+    else:
+        st.warning("Device ID field not found in the data")
+
+@st.fragment
+def rawdata_fragment(df):
+    """Raw Data tab: sortable table or JSON view of the filtered readings."""
+    st.header("Raw Data")
+    
+    # Data format options
+    data_format = st.radio("Data Format", ["Table", "JSON"], horizontal=True)
+    
+    # Row limit
+    row_limit = st.slider("Number of Rows", min_value=10, max_value=1000, value=100, step=10)
+    
+    # Sort options
+    sort_by = st.selectbox("Sort By", ["timestamp", "device_id", "sensor_type"] if all(x in df.columns for x in ["timestamp", "device_id", "sensor_type"]) else df.columns.tolist())
+    sort_order = st.radio("Sort Order", ["Descending", "Ascending"], horizontal=True)
+    
+    # Take the top rows with a partial sort; nsmallest/nlargest only support numeric and
+    # datetime columns, so string and categorical columns fall back to a full sort
+    try:
+        if sort_order == "Ascending":
+            sorted_df = df.nsmallest(row_limit, sort_by)
+        else:
+            sorted_df = df.nlargest(row_limit, sort_by)
+    except TypeError:
+        sorted_df = df.sort_values(
+            by=sort_by, 
+            ascending=(sort_order == "Ascending")
+        ).head(row_limit)
+    
+    # Display according to selected format
+    if data_format == "Table":
+        st.dataframe(sorted_df, use_container_width=True)
+    else:  # JSON format
+        for i, record in enumerate(sorted_df.to_dict('records')):
+            with st.expander(f"Record {i+1}"):
+                st.json(record)
+
 
 # Only show main dashboard content if authenticated
 if st.session_state.get("authenticated", False):
@@ -244,15 +716,19 @@ if st.session_state.get("authenticated", False):
             st.success("Cache cleared successfully")
 
     # ----- Retrieve Data -----
-    with st.spinner("Fetching sensor data..."):
+    try:
         df = fetch_sensor_data(selected_table, selected_region, start_date, end_date)
+    except Exception as e:
+        logger.error(f"Error fetching data from DynamoDB: {str(e)}")
+        st.error(f"Error fetching data from DynamoDB: {str(e)}")
+        df = pd.DataFrame()
 
 # Only process data if authenticated
 if not st.session_state.get("authenticated", False):
     # Stop rendering here if not authenticated
     pass
 elif 'df' in locals() and df.empty:
-    st.info("No data available for the selected filters. Please check your DynamoDB table and IoT pipeline.")
+    st.warning("No data found for the selected date range. Please check your DynamoDB table and IoT pipeline.")
     
     # Show connection guide if no data
     with st.expander("Troubleshooting Guide"):
@@ -265,220 +741,55 @@ elif 'df' in locals() and df.empty:
         5. Check for permissions issues with IAM roles
         """)
 elif 'df' in locals():
+    # Hourly rollups cover every device, so they can't serve a device subset
+    device_subset = False
+    
     # Additional filtering by Device ID if available
     if "device_id" in df.columns:
-        device_ids = sorted(df["device_id"].unique())
+        device_ids = list(df["device_id"].cat.categories)
         selected_devices = st.sidebar.multiselect("Select Device(s)", device_ids, default=device_ids)
         if selected_devices:  # Only filter if devices are selected
             df = df[df["device_id"].isin(selected_devices)]
+            device_subset = len(selected_devices) < len(device_ids)
     
     # Filter by sensor type if available
+    selected_sensors = []
     if "sensor_type" in df.columns:
-        sensor_types = sorted(df["sensor_type"].unique())
+        # Drop categories emptied by the device filter so the defaults match the data
+        sensor_types = list(df["sensor_type"].cat.remove_unused_categories().cat.categories)
         selected_sensors = st.sidebar.multiselect("Select Sensor Types", sensor_types, default=sensor_types)
         if selected_sensors:  # Only filter if sensor types are selected
             df = df[df["sensor_type"].isin(selected_sensors)]
     
+    # One fused groupby over the filtered readings feeds the activity and energy views
+    hourly_agg = aggregate_hourly(df)
+    
+    # Pre-aggregated hourly energy rollups, used by the Energy Analysis tab when available
+    hourly_rollups = pd.DataFrame()
+    if USE_HOURLY_ROLLUPS and not device_subset:
+        try:
+            hourly_rollups = fetch_sensor_data(DYNAMODB_HOURLY_TABLE, selected_region, start_date, end_date,
+                                               aggregation='hourly')
+            if selected_sensors and not hourly_rollups.empty:
+                hourly_rollups = hourly_rollups[hourly_rollups["sensor_type"].isin(selected_sensors)]
+        except Exception as e:
+            logger.warning(f"Hourly rollups unavailable, aggregating raw readings: {str(e)}")
+    
     # ----- Dashboard Tabs -----
     tabs = st.tabs(["Overview", "Energy Analysis", "Device Details", "Raw Data"])
     
     with tabs[0]:  # Overview Tab
-        st.header("System Overview")
-        
-        # KPI Metrics Cards
-        metrics = {}
-        if "building_total_energy_kwh" in df.columns:
-            metrics["Avg Total Energy (kWh)"] = round(df["building_total_energy_kwh"].mean(), 2)
-        if "building_demand_kw" in df.columns:
-            metrics["Avg Demand (kW)"] = round(df["building_demand_kw"].mean(), 2)
-        
-        # Always show record count
-        metrics["Total Records"] = len(df)
-        
-        # Create metric columns dynamically based on available metrics
-        num_metrics = len(metrics)
-        if num_metrics > 0:
-            metric_cols = st.columns(num_metrics)
-            for i, (label, value) in enumerate(metrics.items()):
-                with metric_cols[i]:
-                    st.metric(label, value)
-        
-        # Summary visualization
-        if not df.empty and "timestamp" in df.columns:
-            st.subheader("Recent Activity")
-            
-            # Group by hour and sensor_type if available
-            if "sensor_type" in df.columns:
-                # Create a timeseries of record counts by sensor type
-                df['hour'] = df['timestamp'].dt.floor('H')
-                activity_df = df.groupby(['hour', 'sensor_type']).size().reset_index(name='count')
-                
-                chart = alt.Chart(activity_df).mark_line().encode(
-                    x=alt.X('hour:T', title="Time"),
-                    y=alt.Y('count:Q', title="Number of Records"),
-                    color=alt.Color('sensor_type:N', title="Sensor Type"),
-                    tooltip=['hour:T', 'sensor_type:N', 'count:Q']
-                ).properties(
-                    width=700, 
-                    height=300,
-                    title="Sensor Activity by Hour"
-                ).interactive()
-                
-                st.altair_chart(chart, use_container_width=True)
-            
+        overview_fragment(df, hourly_agg)
+
     with tabs[1]:  # Energy Analysis Tab
-        st.header("Energy Analysis")
-        
-        # ----- Visualization: Building Total Energy Consumption -----
-        if "building_total_energy_kwh" in df.columns:
-            st.subheader("Building Total Energy Consumption")
-            
-            # Aggregate data by hour for smoother visualization
-            df_hourly = df.copy()
-            df_hourly['hour'] = df_hourly['timestamp'].dt.floor('H')
-            energy_hourly = df_hourly.groupby('hour')['building_total_energy_kwh'].mean().reset_index()
-            
-            chart_energy = alt.Chart(energy_hourly).mark_line().encode(
-                x=alt.X('hour:T', title="Time"),
-                y=alt.Y('building_total_energy_kwh:Q', title="Total Energy (kWh)"),
-                tooltip=['hour:T', 'building_total_energy_kwh:Q']
-            ).properties(
-                width=700, 
-                height=300, 
-                title="Total Energy Consumption (Hourly Average)"
-            ).interactive()
-            
-            st.altair_chart(chart_energy, use_container_width=True)
-            
-            # Show daily energy usage pattern if enough data
-            if len(df) > 24:
-                st.subheader("Daily Energy Usage Pattern")
-                df_hourly['hour_of_day'] = df_hourly['timestamp'].dt.hour
-                hourly_pattern = df_hourly.groupby('hour_of_day')['building_total_energy_kwh'].mean().reset_index()
-                
-                chart_pattern = alt.Chart(hourly_pattern).mark_bar().encode(
-                    x=alt.X('hour_of_day:O', title="Hour of Day"),
-                    y=alt.Y('building_total_energy_kwh:Q', title="Avg Energy (kWh)"),
-                    tooltip=['hour_of_day:O', 'building_total_energy_kwh:Q']
-                ).properties(
-                    width=700, 
-                    height=300, 
-                    title="Average Energy Usage by Hour of Day"
-                )
-                
-                st.altair_chart(chart_pattern, use_container_width=True)
-        else:
-            st.warning("Field 'building_total_energy_kwh' not found in the data.")
-        
-        # ----- Visualization: Building Demand -----
-        if "building_demand_kw" in df.columns:
-            st.subheader("Building Demand")
-            
-            # Aggregate by hour
-            if 'hour' not in df_hourly.columns:
-                df_hourly['hour'] = df_hourly['timestamp'].dt.floor('H')
-            demand_hourly = df_hourly.groupby('hour')['building_demand_kw'].mean().reset_index()
-            
-            chart_demand = alt.Chart(demand_hourly).mark_line(color="red").encode(
-                x=alt.X('hour:T', title="Time"),
-                y=alt.Y('building_demand_kw:Q', title="Demand (kW)"),
-                tooltip=['hour:T', 'building_demand_kw:Q']
-            ).properties(
-                width=700, 
-                height=300, 
-                title="Building Demand (Hourly Average)"
-            ).interactive()
-            
-            st.altair_chart(chart_demand, use_container_width=True)
-        else:
-            st.warning("Field 'building_demand_kw' not found in the data.")
-    
+        # Stored rollups only stand in for the local aggregate when they cover every hour of the window
+        energy_fragment(df, hourly_rollups if rollups_cover(hourly_rollups, hourly_agg) else hourly_agg)
+
     with tabs[2]:  # Device Details Tab
-        st.header("Device Details")
-        
-        if "device_id" in df.columns:
-            # Device selector
-            device_list = sorted(df["device_id"].unique())
-            if device_list:
-                selected_device = st.selectbox("Select a Device", device_list)
-                device_df = df[df["device_id"] == selected_device]
-                
-                # Device metadata and stats
-                st.subheader(f"Device: {selected_device}")
-                
-                # Show all sensor types for this device
-                if "sensor_type" in device_df.columns:
-                    st.write("Sensor Types:", ", ".join(sorted(device_df["sensor_type"].unique())))
-                
-                # Display last received data
-                if not device_df.empty:
-                    st.write("Last data received:", device_df["timestamp"].max())
-                    
-                    # Display latest record details
-                    latest_record = device_df.sort_values("timestamp", ascending=False).iloc[0].to_dict()
-                    st.subheader("Latest Reading")
-                    
-                    # Format the data nicely
-                    col1, col2 = st.columns(2)
-                    with col1:
-                        for key, value in list(latest_record.items())[:len(latest_record)//2]:
-                            if key not in ["timestamp", "hour", "hour_of_day"]:
-                                st.write(f"**{key}:** {value}")
-                    with col2:
-                        for key, value in list(latest_record.items())[len(latest_record)//2:]:
-                            if key not in ["timestamp", "hour", "hour_of_day"]:
-                                st.write(f"**{key}:** {value}")
-                                
-                    # Device activity timeline
-                    st.subheader("Device Activity Timeline")
-                    timeline_df = device_df.copy()
-                    timeline_df['hour'] = timeline_df['timestamp'].dt.floor('H')
-                    timeline_df = timeline_df.groupby('hour').size().reset_index(name='messages')
-                    
-                    activity_chart = alt.Chart(timeline_df).mark_bar().encode(
-                        x=alt.X('hour:T', title="Time"),
-                        y=alt.Y('messages:Q', title="Messages"),
-                        tooltip=['hour:T', 'messages:Q']
-                    ).properties(
-                        width=700, 
-                        height=200, 
-                        title="Message Activity Over Time"
-                    )
-                    
-                    st.altair_chart(activity_chart, use_container_width=True)
-                else:
-                    st.warning(f"No data available for device {selected_device}")
-            else:
-                st.warning("No device data available")
-        else:
-            st.warning("Device ID field not found in the data")
-    
+        device_fragment(df, selected_table, selected_region)
+
     with tabs[3]:  # Raw Data Tab
-        st.header("Raw Data")
-        
-        # Data format options
-        data_format = st.radio("Data Format", ["Table", "JSON"], horizontal=True)
-        
-        # Row limit
-        row_limit = st.slider("Number of Rows", min_value=10, max_value=1000, value=100, step=10)
-        
-        # Sort options
-        sort_by = st.selectbox("Sort By", ["timestamp", "device_id", "sensor_type"] if all(x in df.columns for x in ["timestamp", "device_id", "sensor_type"]) else df.columns.tolist())
-        sort_order = st.radio("Sort Order", ["Descending", "Ascending"], horizontal=True)
-        
-        # Sort and limit the dataframe
-        sorted_df = df.sort_values(
-            by=sort_by, 
-            ascending=(sort_order == "Ascending")
-        ).head(row_limit)
-        
-        # Display according to selected format
-        if data_format == "Table":
-            st.dataframe(sorted_df, use_container_width=True)
-        else:  # JSON format
-            for i, record in enumerate(sorted_df.to_dict('records')):
-                with st.expander(f"Record {i+1}"):
-                    st.json(record)
+        rawdata_fragment(df)
 
 # Footer with metadata - only show if authenticated
 if st.session_state.get("authenticated", False):
@@ -491,7 +802,10 @@ if st.session_state.get("authenticated", False):
     with col3:
         # Add monitoring metrics
         try:
-            memory_usage = round(os.popen('ps -o rss= -p %d' % os.getpid()).read().strip())
+            # Resident set size straight from procfs, without forking ps on every rerun
+            with open('/proc/self/statm') as statm:
+                resident_pages = int(statm.read().split()[1])
+            memory_usage = resident_pages * os.sysconf('SC_PAGE_SIZE') // 1024
             st.write(f"Memory usage: {memory_usage} KB")
         except Exception:
             st.write("Monitoring metrics unavailable")
\ No newline at end of file
@@ -1,205 +1,414 @@
 #!/usr/bin/env python3
 """
-app/app.py
+app/app_test.py
 
 A Streamlit dashboard that both simulates IoT sensor data and visualizes it in real time.
-Simulation functions run as background threads and update shared data in st.session_state.
+A single scheduler thread generates readings for every simulated sensor and puts them on
+a queue.SimpleQueue; each script run drains that queue into the session's ring buffers,
+so only the script thread ever touches st.session_state.
 """
 
 import streamlit as st
 import threading
+import queue
 import time
-import random
 import datetime
-import pandas as pd
-import altair as alt
+import pyarrow as pa
+import numpy as np
+from dataclasses import dataclass, fields
 from dotenv import load_dotenv
 import os
 
 # Load environment variables from .env file (if needed)
 load_dotenv()
 
+# Number of latest records kept per sensor
+HISTORY_SIZE = 100
+# Number of random readings drawn at once for each simulated sensor
+BATCH_SIZE = 1024
+
+# -------------- Sensor Samples --------------
+# One fixed-layout sample class per sensor; __slots__ is declared by hand because
+# dataclass(slots=True) needs Python 3.10 and the container runs 3.9
+
+@dataclass
+class BuildingSample:
+    """Building main panel reading."""
+    __slots__ = ("building_total_energy_kwh", "building_demand_kw")
+    building_total_energy_kwh: float
+    building_demand_kw: float
+
+@dataclass
+class HVACSample:
+    """HVAC reading."""
+    __slots__ = ("hvac_runtime_minutes", "hvac_power_kw")
+    hvac_runtime_minutes: int
+    hvac_power_kw: float
+
+@dataclass
+class DHWSample:
+    """Domestic Hot Water (DHW) heater reading."""
+    __slots__ = ("energy_consumption_kwh", "cycle_duration_minutes")
+    energy_consumption_kwh: float
+    cycle_duration_minutes: int
+
+@dataclass
+class LightingSample:
+    """Common lighting reading."""
+    __slots__ = ("lighting_energy_kwh",)
+    lighting_energy_kwh: float
+
+@dataclass
+class OccupancySample:
+    """Occupancy sensor reading."""
+    __slots__ = ("activation_events", "battery_level")
+    activation_events: int
+    battery_level: int
+
+@dataclass
+class EnvironmentSample:
+    """Environmental sensor reading."""
+    __slots__ = ("ambient_temp", "humidity")
+    ambient_temp: float
+    humidity: float
+
+# Sample class of each simulated sensor, which also defines its ring buffer columns
+SENSOR_SAMPLES = {
+    "building": BuildingSample,
+    "hvac": HVACSample,
+    "dhw": DHWSample,
+    "lighting": LightingSample,
+    "occupancy": OccupancySample,
+    "environment": EnvironmentSample
+}
+
+# Ring buffer column dtype of each sample field type
+COLUMN_DTYPES = {float: np.float64, int: np.int32}
+
+def new_buffer(sample_class):
+    """
+    Create a ring buffer holding one preallocated NumPy array per sample field,
+    plus the timestamp column every sensor has.
+    Readings are written in place, so building chart data only wraps the arrays.
+    """
+    columns = {"timestamp": np.empty(HISTORY_SIZE, dtype="datetime64[ns]")}
+    for field in fields(sample_class):
+        columns[field.name] = np.empty(HISTORY_SIZE, dtype=COLUMN_DTYPES[field.type])
+    return {"columns": columns, "count": 0}
+
+def append_reading(buffer, timestamp, sample):
+    """Write one sample into the next ring buffer slot, overwriting the oldest once full."""
+    slot = buffer["count"] % HISTORY_SIZE
+    columns = buffer["columns"]
+    columns["timestamp"][slot] = timestamp
+    for name in sample.__slots__:
+        columns[name][slot] = getattr(sample, name)
+    buffer["count"] += 1
+
+def buffer_table(buffer):
+    """
+    Build an Arrow table of the buffered readings, oldest first.
+    Streamlit ships chart data to the browser as Arrow, so handing it a table built
+    straight from the column arrays skips the pandas DataFrame and its conversion.
+    """
+    count = buffer["count"]
+    # Reruns between readings (widget interactions, refreshes) reuse the table built for this count
+    cached = buffer.get("table")
+    if cached is not None and cached[0] == count:
+        return cached[1]
+    
+    length = min(count, HISTORY_SIZE)
+    # Once the buffer has wrapped, the oldest reading sits in the next slot to be written
+    shift = count % HISTORY_SIZE if count >= HISTORY_SIZE else 0
+    table = pa.table({name: np.roll(column, -shift)[:length]
+                      for name, column in buffer["columns"].items()})
+    buffer["table"] = (count, table)
+    return table
+
 # Initialize shared simulated data in session_state if not present
+# The ring buffers are only written by the script thread; the simulation thread hands
+# readings over through reading_queue instead of touching session state
 if "simulated_data" not in st.session_state:
-    st.session_state.simulated_data = {
-        "building": [],
-        "hvac": [],
-        "dhw": [],
-        "lighting": [],
-        "occupancy": [],
-        "environment": []
-    }
+    st.session_state.simulated_data = {sensor: new_buffer(sample_class)
+                                       for sensor, sample_class in SENSOR_SAMPLES.items()}
+    st.session_state.reading_queue = queue.SimpleQueue()
+
+def drain_readings():
+    """Move readings queued by the simulation thread into the session's ring buffers."""
+    buffers = st.session_state.simulated_data
+    readings = st.session_state.reading_queue
+    while True:
+        try:
+            sensor, timestamp, sample = readings.get_nowait()
+        except queue.Empty:
+            return
+        append_reading(buffers[sensor], timestamp, sample)
 
 # -------------- Simulation Functions --------------
+# Each generator yields one sample per call, drawing its random values BATCH_SIZE at a time
 
-def simulate_building_data():
-    """Simulate building main panel data at 1-minute intervals."""
+def quantized_uniform(rng, low, high, decimals, n):
+    """
+    Draw n values uniformly from [low, high] on a grid of `decimals` decimal places.
+    Drawing integer steps and scaling once replaces rounding every float.
+    """
+    scale = 10 ** decimals
+    return rng.integers(round(low * scale), round(high * scale), n, endpoint=True) / scale
+
+def building_readings(rng):
+    """Simulate building main panel readings."""
     while True:
-        data = {
-            "timestamp": datetime.datetime.now(),
-            "building_total_energy_kwh": round(random.uniform(1000, 2000), 2),
-            "building_demand_kw": round(random.uniform(50, 150), 2)
-        }
-        st.session_state.simulated_data["building"].append(data)
-        # Keep only the latest 100 records
-        st.session_state.simulated_data["building"] = st.session_state.simulated_data["building"][-100:]
-        time.sleep(60)
+        batch = zip(quantized_uniform(rng, 1000, 2000, 2, BATCH_SIZE),
+                    quantized_uniform(rng, 50, 150, 2, BATCH_SIZE))
+        for energy, demand in batch:
+            yield BuildingSample(energy, demand)
 
-def simulate_hvac_data():
-    """Simulate HVAC data at 1-minute intervals."""
+def hvac_readings(rng):
+    """Simulate HVAC readings."""
     while True:
-        data = {
-            "timestamp": datetime.datetime.now(),
-            "hvac_runtime_minutes": random.randint(0, 60),
-            "hvac_power_kw": round(random.uniform(0.5, 3.0), 2)
-        }
-        st.session_state.simulated_data["hvac"].append(data)
-        st.session_state.simulated_data["hvac"] = st.session_state.simulated_data["hvac"][-100:]
-        time.sleep(60)
+        batch = zip(rng.integers(0, 60, BATCH_SIZE, endpoint=True),
+                    quantized_uniform(rng, 0.5, 3.0, 2, BATCH_SIZE))
+        for runtime, power in batch:
+            yield HVACSample(runtime, power)
 
-def simulate_dhw_data():
-    """Simulate Domestic Hot Water (DHW) heater data at 5-minute intervals."""
+def dhw_readings(rng):
+    """Simulate Domestic Hot Water (DHW) heater readings."""
     while True:
-        data = {
-            "timestamp": datetime.datetime.now(),
-            "energy_consumption_kwh": round(random.uniform(10, 50), 2),
-            "cycle_duration_minutes": random.randint(5, 30)
-        }
-        st.session_state.simulated_data["dhw"].append(data)
-        st.session_state.simulated_data["dhw"] = st.session_state.simulated_data["dhw"][-100:]
-        time.sleep(300)
+        batch = zip(quantized_uniform(rng, 10, 50, 2, BATCH_SIZE),
+                    rng.integers(5, 30, BATCH_SIZE, endpoint=True))
+        for energy, duration in batch:
+            yield DHWSample(energy, duration)
 
-def simulate_lighting_data():
-    """Simulate common lighting data at 1-minute intervals."""
+def lighting_readings(rng):
+    """Simulate common lighting readings."""
     while True:
-        data = {
-            "timestamp": datetime.datetime.now(),
-            "lighting_energy_kwh": round(random.uniform(1, 5), 2)
-        }
-        st.session_state.simulated_data["lighting"].append(data)
-        st.session_state.simulated_data["lighting"] = st.session_state.simulated_data["lighting"][-100:]
-        time.sleep(60)
+        for energy in quantized_uniform(rng, 1, 5, 2, BATCH_SIZE):
+            yield LightingSample(energy)
 
-def simulate_occupancy_data():
-    """Simulate occupancy sensor events at 1-minute intervals."""
+def occupancy_readings(rng):
+    """Simulate occupancy sensor events."""
     while True:
-        data = {
-            "timestamp": datetime.datetime.now(),
-            "activation_events": random.randint(0, 10),
-            "battery_level": random.randint(20, 100)
-        }
-        st.session_state.simulated_data["occupancy"].append(data)
-        st.session_state.simulated_data["occupancy"] = st.session_state.simulated_data["occupancy"][-100:]
-        time.sleep(60)
+        batch = zip(rng.integers(0, 10, BATCH_SIZE, endpoint=True),
+                    rng.integers(20, 100, BATCH_SIZE, endpoint=True))
+        for events, battery in batch:
+            yield OccupancySample(events, battery)
 
-def simulate_environment_data():
-    """Simulate environmental sensor data at 5-minute intervals."""
+def environment_readings(rng):
+    """Simulate environmental sensor readings."""
     while True:
-        data = {
-            "timestamp": datetime.datetime.now(),
-            "ambient_temp": round(random.uniform(65, 80), 1),
-            "humidity": round(random.uniform(30, 60), 1)
-        }
-        st.session_state.simulated_data["environment"].append(data)
-        st.session_state.simulated_data["environment"] = st.session_state.simulated_data["environment"][-100:]
-        time.sleep(300)
+        batch = zip(quantized_uniform(rng, 65, 80, 1, BATCH_SIZE),
+                    quantized_uniform(rng, 30, 60, 1, BATCH_SIZE))
+        for temp, humidity in batch:
+            yield EnvironmentSample(temp, humidity)
+
+# Scheduler wake-up interval in seconds; every sensor interval is a multiple of it
+SCHEDULER_TICK = 60
+
+# (sensor, interval in seconds, reading generator)
+SIMULATORS = [
+    ("building", 60, building_readings),
+    ("hvac", 60, hvac_readings),
+    ("dhw", 300, dhw_readings),
+    ("lighting", 60, lighting_readings),
+    ("occupancy", 60, occupancy_readings),
+    ("environment", 300, environment_readings)
+]
+
+def run_simulations(readings_queue):
+    """
+    Drive every simulated sensor from a single thread.
+    The thread wakes once per SCHEDULER_TICK, aligned to the tick boundary, and
+    queues a reading for each sensor whose interval has elapsed.
+    """
+    rng = np.random.default_rng()
+    sensors = [(sensor, interval // SCHEDULER_TICK, readings(rng)) for sensor, interval, readings in SIMULATORS]
+    tick = 0
+    while True:
+        # One clock read per tick stamps every sensor written in it
+        timestamp = np.datetime64(datetime.datetime.now(), "ns")
+        for sensor, every, readings in sensors:
+            if tick % every == 0:
+                readings_queue.put((sensor, timestamp, next(readings)))
+        tick += 1
+        time.sleep(SCHEDULER_TICK - (time.monotonic() % SCHEDULER_TICK))
 
-# -------------- Start Simulation Threads (Once) --------------
+# -------------- Start Simulation Thread (Once) --------------
 
 if "simulation_started" not in st.session_state:
     st.session_state.simulation_started = True
-    threading.Thread(target=simulate_building_data, daemon=True).start()
-    threading.Thread(target=simulate_hvac_data, daemon=True).start()
-    threading.Thread(target=simulate_dhw_data, daemon=True).start()
-    threading.Thread(target=simulate_lighting_data, daemon=True).start()
-    threading.Thread(target=simulate_occupancy_data, daemon=True).start()
-    threading.Thread(target=simulate_environment_data, daemon=True).start()
+    # The queue is handed over directly; session_state isn't reachable from other threads
+    threading.Thread(target=run_simulations, args=(st.session_state.reading_queue,), daemon=True).start()
+
+# -------------- Chart Specs --------------
+
+# Vega-Lite layout shared by every sensor chart; passed to st.vega_lite_chart as a plain dict
+# so no Altair objects are built or validated on rerun
+CHART_TEMPLATE = {
+    "width": 700,
+    "height": 300,
+    "mark": {"type": "line"},
+    "encoding": {"x": {"field": "timestamp", "type": "temporal", "title": "Time"}}
+}
+
+def line_chart_spec(field, axis_title, title, color=None, extra_tooltip=()):
+    """Build the Vega-Lite spec of a line chart of `field` over time from CHART_TEMPLATE."""
+    mark = {**CHART_TEMPLATE["mark"], "color": color} if color else CHART_TEMPLATE["mark"]
+    tooltip = [{"field": "timestamp", "type": "temporal"}] + [
+        {"field": name, "type": "quantitative"} for name in (field, *extra_tooltip)
+    ]
+    return {
+        **CHART_TEMPLATE,
+        "title": title,
+        "mark": mark,
+        "encoding": {
+            **CHART_TEMPLATE["encoding"],
+            "y": {"field": field, "type": "quantitative", "title": axis_title},
+            "tooltip": tooltip
+        }
+    }
+
+# Specs are built once per process and the same dicts are returned to every session
+# without copying, so callers must not mutate them
+@st.cache_resource
+def chart_specs():
+    """Return the Vega-Lite spec of every sensor chart, keyed by sensor type."""
+    return {
+        "building": line_chart_spec(
+            "building_total_energy_kwh",
+            "Total Energy (kWh)",
+            "Total Energy Consumption Over Time"
+        ),
+        "hvac": line_chart_spec(
+            "hvac_power_kw",
+            "HVAC Power (kW)",
+            "HVAC Power Consumption Over Time",
+            color="green"
+        ),
+        "dhw": line_chart_spec(
+            "energy_consumption_kwh",
+            "Energy Consumption (kWh)",
+            "DHW Energy Consumption Over Time",
+            color="orange"
+        ),
+        "lighting": line_chart_spec(
+            "lighting_energy_kwh",
+            "Lighting Energy (kWh)",
+            "Lighting Energy Consumption Over Time",
+            color="purple"
+        ),
+        "occupancy": line_chart_spec(
+            "activation_events",
+            "Activation Events",
+            "Occupancy Activation Events Over Time",
+            color="red",
+            extra_tooltip=("battery_level",)
+        ),
+        "environment": line_chart_spec(
+            "ambient_temp",
+            "Ambient Temperature (°F)",
+            "Ambient Temperature Over Time",
+            color="blue",
+            extra_tooltip=("humidity",)
+        )
+    }
 
 # -------------- Dashboard UI --------------
 
 st.title("Interactive EMS Dashboard")
 st.markdown("This dashboard displays real-time simulated sensor data.")
 
+# Pick up readings queued since the last run before anything is rendered
+drain_readings()
+
 # Refresh button to manually force a re-run of the script
 if st.button("Refresh Data"):
-    st.experimental_rerun()
+    st.rerun()
+
+# Each sensor section is a fragment that reruns on its sensor's publish interval,
+# so a new reading only rebuilds that sensor's chart instead of the whole page.
 
 # Display Building Data
-st.header("Building Data")
-if st.session_state.simulated_data["building"]:
-    df_building = pd.DataFrame(st.session_state.simulated_data["building"])
-    chart_building = alt.Chart(df_building).mark_line().encode(
-        x=alt.X("timestamp:T", title="Time"),
-        y=alt.Y("building_total_energy_kwh:Q", title="Total Energy (kWh)"),
-        tooltip=["timestamp:T", "building_total_energy_kwh:Q"]
-    ).properties(width=700, height=300, title="Total Energy Consumption Over Time")
-    st.altair_chart(chart_building, use_container_width=True)
-else:
-    st.write("No building data available yet.")
+@st.fragment(run_every=60)
+def render_building():
+    """Building section: total energy consumption chart."""
+    drain_readings()
+    st.header("Building Data")
+    if st.session_state.simulated_data["building"]["count"]:
+        table_building = buffer_table(st.session_state.simulated_data["building"])
+        st.vega_lite_chart(table_building, chart_specs()["building"], use_container_width=True)
+    else:
+        st.write("No building data available yet.")
+
+render_building()
 
 # Display HVAC Data
-st.header("HVAC Data")
-if st.session_state.simulated_data["hvac"]:
-    df_hvac = pd.DataFrame(st.session_state.simulated_data["hvac"])
-    chart_hvac = alt.Chart(df_hvac).mark_line(color="green").encode(
-        x=alt.X("timestamp:T", title="Time"),
-        y=alt.Y("hvac_power_kw:Q", title="HVAC Power (kW)"),
-        tooltip=["timestamp:T", "hvac_power_kw:Q"]
-    ).properties(width=700, height=300, title="HVAC Power Consumption Over Time")
-    st.altair_chart(chart_hvac, use_container_width=True)
-else:
-    st.write("No HVAC data available yet.")
+@st.fragment(run_every=60)
+def render_hvac():
+    """HVAC section: power consumption chart."""
+    drain_readings()
+    st.header("HVAC Data")
+    if st.session_state.simulated_data["hvac"]["count"]:
+        table_hvac = buffer_table(st.session_state.simulated_data["hvac"])
+        st.vega_lite_chart(table_hvac, chart_specs()["hvac"], use_container_width=True)
+    else:
+        st.write("No HVAC data available yet.")
+
+render_hvac()
 
 # Display DHW Data
-st.header("DHW Data")
-if st.session_state.simulated_data["dhw"]:
-    df_dhw = pd.DataFrame(st.session_state.simulated_data["dhw"])
-    chart_dhw = alt.Chart(df_dhw).mark_line(color="orange").encode(
-        x=alt.X("timestamp:T", title="Time"),
-        y=alt.Y("energy_consumption_kwh:Q", title="Energy Consumption (kWh)"),
-        tooltip=["timestamp:T", "energy_consumption_kwh:Q"]
-    ).properties(width=700, height=300, title="DHW Energy Consumption Over Time")
-    st.altair_chart(chart_dhw, use_container_width=True)
-else:
-    st.write("No DHW data available yet.")
+@st.fragment(run_every=300)
+def render_dhw():
+    """DHW section: heater energy consumption chart."""
+    drain_readings()
+    st.header("DHW Data")
+    if st.session_state.simulated_data["dhw"]["count"]:
+        table_dhw = buffer_table(st.session_state.simulated_data["dhw"])
+        st.vega_lite_chart(table_dhw, chart_specs()["dhw"], use_container_width=True)
+    else:
+        st.write("No DHW data available yet.")
+
+render_dhw()
 
 # Display Lighting Data
-st.header("Lighting Data")
-if st.session_state.simulated_data["lighting"]:
-    df_lighting = pd.DataFrame(st.session_state.simulated_data["lighting"])
-    chart_lighting = alt.Chart(df_lighting).mark_line(color="purple").encode(
-        x=alt.X("timestamp:T", title="Time"),
-        y=alt.Y("lighting_energy_kwh:Q", title="Lighting Energy (kWh)"),
-        tooltip=["timestamp:T", "lighting_energy_kwh:Q"]
-    ).properties(width=700, height=300, title="Lighting Energy Consumption Over Time")
-    st.altair_chart(chart_lighting, use_container_width=True)
-else:
-    st.write("No lighting data available yet.")
+@st.fragment(run_every=60)
+def render_lighting():
+    """Lighting section: lighting energy consumption chart."""
+    drain_readings()
+    st.header("Lighting Data")
+    if st.session_state.simulated_data["lighting"]["count"]:
+        table_lighting = buffer_table(st.session_state.simulated_data["lighting"])
+        st.vega_lite_chart(table_lighting, chart_specs()["lighting"], use_container_width=True)
+    else:
+        st.write("No lighting data available yet.")
+
+render_lighting()
 
 # Display Occupancy Data
-st.header("Occupancy Data")
-if st.session_state.simulated_data["occupancy"]:
-    df_occupancy = pd.DataFrame(st.session_state.simulated_data["occupancy"])
-    chart_occupancy = alt.Chart(df_occupancy).mark_line(color="red").encode(
-        x=alt.X("timestamp:T", title="Time"),
-        y=alt.Y("activation_events:Q", title="Activation Events"),
-        tooltip=["timestamp:T", "activation_events:Q", "battery_level:Q"]
-    ).properties(width=700, height=300, title="Occupancy Activation Events Over Time")
-    st.altair_chart(chart_occupancy, use_container_width=True)
-else:
-    st.write("No occupancy data available yet.")
+@st.fragment(run_every=60)
+def render_occupancy():
+    """Occupancy section: activation events chart."""
+    drain_readings()
+    st.header("Occupancy Data")
+    if st.session_state.simulated_data["occupancy"]["count"]:
+        table_occupancy = buffer_table(st.session_state.simulated_data["occupancy"])
+        st.vega_lite_chart(table_occupancy, chart_specs()["occupancy"], use_container_width=True)
+    else:
+        st.write("No occupancy data available yet.")
+
+render_occupancy()
 
 # Display Environmental Data
-st.header("Environmental Data")
-if st.session_state.simulated_data["environment"]:
-    df_environment = pd.DataFrame(st.session_state.simulated_data["environment"])
-    chart_environment = alt.Chart(df_environment).mark_line(color="blue").encode(
-        x=alt.X("timestamp:T", title="Time"),
-        y=alt.Y("ambient_temp:Q", title="Ambient Temperature (°F)"),
-        tooltip=["timestamp:T", "ambient_temp:Q", "humidity:Q"]
-    ).properties(width=700, height=300, title="Ambient Temperature Over Time")
-    st.altair_chart(chart_environment, use_container_width=True)
-else:
-    st.write("No environmental data available yet.")
+@st.fragment(run_every=300)
+def render_environment():
+    """Environmental section: ambient temperature chart."""
+    drain_readings()
+    st.header("Environmental Data")
+    if st.session_state.simulated_data["environment"]["count"]:
+        table_environment = buffer_table(st.session_state.simulated_data["environment"])
+        st.vega_lite_chart(table_environment, chart_specs()["environment"], use_container_width=True)
+    else:
+        st.write("No environmental data available yet.")
+
+render_environment()
 
 st.write("Last updated:", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
\ No newline at end of file
@@ -0,0 +1,140 @@
+"""
+sensors.py
+
+Simulated sensor value generation for the IoT simulators.
+Random values are drawn in NumPy batches and handed out one reading at a time,
+so the publish loops only index pre-generated lists.
+"""
+
+import os
+import numpy as np
+
+# ----- Batched random value generation -----
+# Values are drawn BATCH_SIZE at a time with NumPy and handed out one per reading
+BATCH_SIZE = int(os.getenv("SIMULATOR_BATCH_SIZE", "1024"))
+rng = np.random.default_rng()
+
+def quantized_uniform(low, high, decimals, n):
+    """
+    Draw n values uniformly from [low, high] on a grid of `decimals` decimal places.
+    Drawing integer steps and scaling once replaces rounding every float.
+    """
+    scale = 10 ** decimals
+    return rng.integers(round(low * scale), round(high * scale), n, endpoint=True) / scale
+
+# How each field's batch is drawn (integer bounds are inclusive, like random.randint)
+FIELD_DRAWS = {
+    "building_total_energy_kwh": lambda n: quantized_uniform(1000, 2000, 2, n),
+    "building_demand_kw": lambda n: quantized_uniform(50, 150, 2, n),
+    "hvac_runtime_minutes": lambda n: rng.integers(0, 60, n, endpoint=True),
+    "hvac_power_kw": lambda n: quantized_uniform(0.5, 3.0, 2, n),
+    "energy_consumption_kwh": lambda n: quantized_uniform(10, 50, 2, n),
+    "cycle_duration_minutes": lambda n: rng.integers(5, 30, n, endpoint=True),
+    "lighting_energy_kwh": lambda n: quantized_uniform(1, 5, 2, n),
+    "activation_events": lambda n: rng.integers(0, 10, n, endpoint=True),
+    "battery_level": lambda n: rng.integers(20, 100, n, endpoint=True),
+    "ambient_temp": lambda n: quantized_uniform(65, 80, 1, n),
+    "humidity": lambda n: quantized_uniform(30, 60, 1, n),
+    # Fields only published by simulate_iot_data_v2.py
+    "latency_ms": lambda n: rng.integers(10, 100, n, endpoint=True),
+    "packet_loss_percent": lambda n: quantized_uniform(0, 5, 2, n),
+    "sub_meter_energy_kwh": lambda n: quantized_uniform(100, 200, 2, n),
+    "demand_kw": lambda n: quantized_uniform(10, 50, 2, n),
+    "appliance_energy_kwh": lambda n: quantized_uniform(1, 5, 2, n),
+    "temperature_f": lambda n: quantized_uniform(65, 75, 2, n),
+    # v2 values that are not payload fields of the same name
+    "gateway_status": lambda n: rng.choice(["OK", "WARN", "ERROR"], n),
+    "occupancy_status": lambda n: rng.choice(["OK", "LOW_BATTERY"], n),
+    "occupancy_event_delay": lambda n: rng.integers(10, 30, n, endpoint=True),
+}
+
+# Current batch (as plain Python numbers) and read position per field
+batches = {}
+
+def next_value(field):
+    """Return the next pre-generated value for a field, drawing a new batch when exhausted."""
+    values, position = batches.get(field, ((), 0))
+    if position >= len(values):
+        # tolist() converts to Python numbers once per batch so JSON serializers accept them
+        values, position = FIELD_DRAWS[field](BATCH_SIZE).tolist(), 0
+    batches[field] = (values, position + 1)
+    return values[position]
+
+# ----- Per-sensor generators -----
+# Each sensor's fields are spelled out in its own function, so a reading is built
+# without looking up the sensor type or looping over its field names
+
+def gen_building(device_id, edge_time_stamp, ttl_value):
+    """Main panel energy meter reading"""
+    return {
+        "device_id": device_id,
+        "sensor_type": "building",
+        "edge_time_stamp": edge_time_stamp,
+        "ttl": ttl_value,
+        "building_total_energy_kwh": next_value("building_total_energy_kwh"),
+        "building_demand_kw": next_value("building_demand_kw")
+    }
+
+def gen_hvac(device_id, edge_time_stamp, ttl_value):
+    """HVAC runtime and power reading"""
+    return {
+        "device_id": device_id,
+        "sensor_type": "hvac",
+        "edge_time_stamp": edge_time_stamp,
+        "ttl": ttl_value,
+        "hvac_runtime_minutes": next_value("hvac_runtime_minutes"),
+        "hvac_power_kw": next_value("hvac_power_kw")
+    }
+
+def gen_dhw(device_id, edge_time_stamp, ttl_value):
+    """Domestic hot water heater reading"""
+    return {
+        "device_id": device_id,
+        "sensor_type": "dhw",
+        "edge_time_stamp": edge_time_stamp,
+        "ttl": ttl_value,
+        "energy_consumption_kwh": next_value("energy_consumption_kwh"),
+        "cycle_duration_minutes": next_value("cycle_duration_minutes")
+    }
+
+def gen_lighting(device_id, edge_time_stamp, ttl_value):
+    """Lighting circuit reading"""
+    return {
+        "device_id": device_id,
+        "sensor_type": "lighting",
+        "edge_time_stamp": edge_time_stamp,
+        "ttl": ttl_value,
+        "lighting_energy_kwh": next_value("lighting_energy_kwh")
+    }
+
+def gen_occupancy(device_id, edge_time_stamp, ttl_value):
+    """Occupancy sensor reading"""
+    return {
+        "device_id": device_id,
+        "sensor_type": "occupancy",
+        "edge_time_stamp": edge_time_stamp,
+        "ttl": ttl_value,
+        "activation_events": next_value("activation_events"),
+        "battery_level": next_value("battery_level")
+    }
+
+def gen_environment(device_id, edge_time_stamp, ttl_value):
+    """Ambient temperature and humidity reading"""
+    return {
+        "device_id": device_id,
+        "sensor_type": "environment",
+        "edge_time_stamp": edge_time_stamp,
+        "ttl": ttl_value,
+        "ambient_temp": next_value("ambient_temp"),
+        "humidity": next_value("humidity")
+    }
+
+# Generator for each sensor type, for callers that pick the sensor at runtime
+GEN = {
+    "building": gen_building,
+    "hvac": gen_hvac,
+    "dhw": gen_dhw,
+    "lighting": gen_lighting,
+    "occupancy": gen_occupancy,
+    "environment": gen_environment,
+}
@@ -9,32 +9,50 @@ or environment variables.
 """
 
 import json
-import random
+import functools
 import time
 import datetime
 import os
-import boto3
+import orjson
 import logging
+import threading
 from pathlib import Path
+from urllib.request import urlopen
 from dotenv import load_dotenv
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 
-# Set up logging
-logging.basicConfig(level=logging.INFO, 
+# Load environment variables from .env file if it exists
+load_dotenv()
+
+# Set up logging (after load_dotenv so LOG_LEVEL from .env applies)
+# LOG_LEVEL=WARNING silences the per-publish INFO lines; their arguments are then never formatted
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), 
                     format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("IoTSimulator")
 
-# Load environment variables from .env file if it exists
-load_dotenv()
+# Imported after load_dotenv so SIMULATOR_BATCH_SIZE from .env applies
+from sensors import (GEN, gen_building, gen_hvac, gen_dhw, gen_lighting,
+                     gen_occupancy, gen_environment)
+
+# Get device ID from environment variable or use default
+DEVICE_ID = os.getenv("DEVICE_ID", "ems-monitoring-device")
 
 # ----- Helper to retrieve secrets from AWS Secrets Manager -----
+@functools.lru_cache(maxsize=None)
+def get_secrets_client(region_name):
+    """Create the Secrets Manager client for a region once and share it across lookups"""
+    # Imported here so runs that take credentials from the environment or files never load boto3
+    import boto3
+    
+    return boto3.session.Session(region_name=region_name).client("secretsmanager")
+
+@functools.lru_cache(maxsize=8)
 def get_secret(secret_name, region_name=None):
-    """Retrieve a secret from AWS Secrets Manager"""
+    """Retrieve a secret from AWS Secrets Manager (memoized for the life of the process)"""
     if not region_name:
         region_name = os.getenv("AWS_REGION", "us-east-1")
     
     try:
-        client = boto3.client("secretsmanager", region_name=region_name)
+        client = get_secrets_client(region_name)
         get_secret_value_response = client.get_secret_value(SecretId=secret_name)
         secret = get_secret_value_response["SecretString"]
         return json.loads(secret)
@@ -99,6 +117,8 @@ if not IOT_ENDPOINT:
 CERTIFICATE_PATH = "/tmp/certificate.pem.crt"
 PRIVATE_KEY_PATH = "/tmp/private.pem.key"
 
+ROOT_CA_URL = "https://www.amazontrust.com/repository/AmazonRootCA1.pem"
+
 # Try to locate AmazonRootCA1.pem in a few different places
 root_ca_locations = [
     os.getenv("ROOT_CA_PATH"),
@@ -117,11 +137,16 @@ for location in root_ca_locations:
 if not ROOT_CA_PATH:
     logger.warning("AmazonRootCA1.pem not found. Downloading it now...")
     try:
-        import requests
-        root_ca_content = requests.get("https://www.amazontrust.com/repository/AmazonRootCA1.pem").text
+        # urlopen raises on HTTP errors, so an error page is never written out as the CA
+        with urlopen(ROOT_CA_URL, timeout=10) as response:
+            root_ca_content = response.read().decode()
+        if not root_ca_content.startswith("-----BEGIN CERTIFICATE-----"):
+            raise ValueError("downloaded file is not a PEM certificate")
         os.makedirs("./certs", exist_ok=True)
-        with open("./certs/AmazonRootCA1.pem", "w") as f:
+        # Write to a temporary name first so an interrupted download never leaves a partial CA behind
+        with open("./certs/AmazonRootCA1.pem.tmp", "w") as f:
             f.write(root_ca_content)
+        os.replace("./certs/AmazonRootCA1.pem.tmp", "./certs/AmazonRootCA1.pem")
         ROOT_CA_PATH = "./certs/AmazonRootCA1.pem"
         logger.info(f"Downloaded AmazonRootCA1.pem to {ROOT_CA_PATH}")
     except Exception as e:
@@ -130,6 +155,8 @@ if not ROOT_CA_PATH:
 
 # ----- Initialize the MQTT Client -----
 logger.info(f"Connecting to IoT endpoint: {IOT_ENDPOINT}")
+# Deferred until the configuration above has been validated
+from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
 client = AWSIoTMQTTClient("ems-simulated-device")
 client.configureEndpoint(IOT_ENDPOINT, 8883)
 client.configureCredentials(ROOT_CA_PATH, PRIVATE_KEY_PATH, CERTIFICATE_PATH)
@@ -156,39 +183,6 @@ for attempt in range(max_retries):
             logger.error("Failed to connect to AWS IoT Core after maximum retries")
             raise
 
-def generate_sensor_data(sensor_type):
-    """Generate simulated sensor data based on the sensor type"""
-    # Get device ID from environment variable or use default
-    device_id = os.getenv("DEVICE_ID", "ems-monitoring-device")
-    
-    # Add TTL value for DynamoDB (current timestamp + 30 days in seconds)
-    ttl_value = int((datetime.datetime.now() + 
-                    datetime.timedelta(days=30)).timestamp())
-    
-    data = {
-        "device_id": device_id,
-        "sensor_type": sensor_type,
-        "edge_time_stamp": str(datetime.datetime.now()),
-        "ttl": ttl_value
-    }
-    if sensor_type == "building":
-        data["building_total_energy_kwh"] = round(random.uniform(1000, 2000), 2)
-        data["building_demand_kw"] = round(random.uniform(50, 150), 2)
-    elif sensor_type == "hvac":
-        data["hvac_runtime_minutes"] = random.randint(0, 60)
-        data["hvac_power_kw"] = round(random.uniform(0.5, 3.0), 2)
-    elif sensor_type == "dhw":
-        data["energy_consumption_kwh"] = round(random.uniform(10, 50), 2)
-        data["cycle_duration_minutes"] = random.randint(5, 30)
-    elif sensor_type == "lighting":
-        data["lighting_energy_kwh"] = round(random.uniform(1, 5), 2)
-    elif sensor_type == "occupancy":
-        data["activation_events"] = random.randint(0, 10)
-        data["battery_level"] = random.randint(20, 100)
-    elif sensor_type == "environment":
-        data["ambient_temp"] = round(random.uniform(65, 80), 1)
-        data["humidity"] = round(random.uniform(30, 60), 1)
-    return data
 
 def publish_with_retry(topic, message, qos=1, max_retries=3):
     """Publish a message with retry logic"""
@@ -204,36 +198,115 @@ def publish_with_retry(topic, message, qos=1, max_retries=3):
                 logger.error(f"Failed to publish to topic {topic} after maximum retries")
                 return False
 
+# ----- Pipelined publishing -----
+# Seconds to wait for a PUBACK before an asynchronous publish is retried synchronously
+PUBACK_TIMEOUT = int(os.getenv("PUBACK_TIMEOUT_SECONDS", "30"))
+
+# Packet id -> (topic, message, send time) of asynchronous publishes awaiting PUBACK
+pending_publishes = {}
+# Packet ids acknowledged before publish_async recorded them
+early_acks = set()
+# Guards both, since PUBACK callbacks run on the SDK's event thread
+pending_lock = threading.Lock()
+
+def on_puback(mid):
+    """PUBACK callback: the broker has acknowledged packet `mid`."""
+    with pending_lock:
+        if pending_publishes.pop(mid, None) is None:
+            early_acks.add(mid)
+
+def publish_async(topic, message, qos=1):
+    """
+    Publish without waiting for the PUBACK, so every publish of a tick is in flight at once.
+    Falls back to a blocking publish if the message can't be queued.
+    """
+    try:
+        mid = client.publishAsync(topic, message, qos, ackCallback=on_puback)
+    except Exception as e:
+        logger.error(f"Asynchronous publish to {topic} failed: {str(e)}")
+        return publish_with_retry(topic, message, qos)
+    
+    # While offline the SDK queues the message itself and returns a placeholder id
+    if not isinstance(mid, int) or mid <= 0:
+        return mid
+    
+    with pending_lock:
+        if mid in early_acks:
+            early_acks.discard(mid)
+        else:
+            pending_publishes[mid] = (topic, message, time.monotonic())
+    return mid
+
+def retry_unacknowledged():
+    """Republish, with the blocking retry path, every publish still unacknowledged after PUBACK_TIMEOUT."""
+    cutoff = time.monotonic() - PUBACK_TIMEOUT
+    with pending_lock:
+        expired = [mid for mid, (_, _, sent) in pending_publishes.items() if sent < cutoff]
+        retries = [pending_publishes.pop(mid) for mid in expired]
+    
+    for topic, message, _ in retries:
+        logger.warning("No PUBACK for %s after %ss, retrying", topic, PUBACK_TIMEOUT)
+        publish_with_retry(topic, message)
+
+# TTL for DynamoDB items (TTL_DAYS, default 30, in seconds)
+TTL_SECONDS = int(os.getenv("TTL_DAYS", "30")) * 86400
+
+def now_stamp():
+    """
+    Current time in the edge_time_stamp format (same as str(datetime.now())).
+    Every reading gets its own stamp: the IoT rule keys sensor_data on
+    (topic(1), edge_time_stamp), so readings sharing a stamp overwrite each other.
+    """
+    return datetime.datetime.now().isoformat(sep=" ")
+
 # Main loop
 logger.info("Starting IoT data simulation")
 interval = int(os.getenv("PUBLISH_INTERVAL_SECONDS", "5"))
+# Publish all sensor readings of a tick as one ems/all message (requires terraform/batch_fanout.tf)
+BATCH_PUBLISH = os.getenv("SIMULATOR_BATCH_PUBLISH", "false").lower() == "true"
 
 try:
     while True:
-        # Publish sensor data under different topics
-        building_data = generate_sensor_data("building")
-        publish_with_retry("ems/building", json.dumps(building_data))
-        logger.info(f"Published building data: {building_data}")
-
-        hvac_data = generate_sensor_data("hvac")
-        publish_with_retry("ems/hvac", json.dumps(hvac_data))
-        logger.info(f"Published HVAC data: {hvac_data}")
-
-        dhw_data = generate_sensor_data("dhw")
-        publish_with_retry("ems/dhw", json.dumps(dhw_data))
-        logger.info(f"Published DHW data: {dhw_data}")
-
-        lighting_data = generate_sensor_data("lighting")
-        publish_with_retry("ems/lighting", json.dumps(lighting_data))
-        logger.info(f"Published Lighting data: {lighting_data}")
-
-        occupancy_data = generate_sensor_data("occupancy")
-        publish_with_retry("ems/occupancy", json.dumps(occupancy_data))
-        logger.info(f"Published Occupancy data: {occupancy_data}")
-
-        environment_data = generate_sensor_data("environment")
-        publish_with_retry("ems/environment", json.dumps(environment_data))
-        logger.info(f"Published Environment data: {environment_data}")
+        # The TTL is shared by the tick's readings; each reading is stamped separately
+        ttl_value = int(time.time()) + TTL_SECONDS
+        
+        retry_unacknowledged()
+        
+        if BATCH_PUBLISH:
+            # One message per tick; the ems/all rule fans it back out to one item per sensor
+            readings = {sensor_type: generate(DEVICE_ID, now_stamp(), ttl_value)
+                        for sensor_type, generate in GEN.items()}
+            publish_async("ems/all", orjson.dumps({"ts": now_stamp(), "sensors": readings}))
+            logger.info("Published batched data: %s", readings)
+            time.sleep(interval)
+            continue
+        
+        # Publish sensor data under different topics; orjson serializes straight to UTF-8 bytes
+        # in C, and the MQTT client publishes bytes payloads as-is. The publishes are pipelined,
+        # so the tick costs about one round-trip instead of one per sensor
+        building_data = gen_building(DEVICE_ID, now_stamp(), ttl_value)
+        publish_async("ems/building", orjson.dumps(building_data))
+        logger.info("Published building data: %s", building_data)
+
+        hvac_data = gen_hvac(DEVICE_ID, now_stamp(), ttl_value)
+        publish_async("ems/hvac", orjson.dumps(hvac_data))
+        logger.info("Published HVAC data: %s", hvac_data)
+
+        dhw_data = gen_dhw(DEVICE_ID, now_stamp(), ttl_value)
+        publish_async("ems/dhw", orjson.dumps(dhw_data))
+        logger.info("Published DHW data: %s", dhw_data)
+
+        lighting_data = gen_lighting(DEVICE_ID, now_stamp(), ttl_value)
+        publish_async("ems/lighting", orjson.dumps(lighting_data))
+        logger.info("Published Lighting data: %s", lighting_data)
+
+        occupancy_data = gen_occupancy(DEVICE_ID, now_stamp(), ttl_value)
+        publish_async("ems/occupancy", orjson.dumps(occupancy_data))
+        logger.info("Published Occupancy data: %s", occupancy_data)
+
+        environment_data = gen_environment(DEVICE_ID, now_stamp(), ttl_value)
+        publish_async("ems/environment", orjson.dumps(environment_data))
+        logger.info("Published Environment data: %s", environment_data)
 
         time.sleep(interval)
 except KeyboardInterrupt:
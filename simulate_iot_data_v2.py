@@ -15,41 +15,66 @@ This script is designed to run as a service when the application is deployed.
 
 import os
 import json
-import random
+import functools
 import time
 import datetime
+import heapq
 import threading
 import logging
+import queue
+import atexit
 import signal
+import socket
 import sys
 import boto3
-import requests
+import orjson
 from pathlib import Path
+from dataclasses import dataclass
+from collections import namedtuple
+from logging.handlers import QueueHandler, QueueListener
+from urllib.request import urlopen
 from dotenv import load_dotenv
-from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient
+from AWSIoTPythonSDK.MQTTLib import AWSIoTMQTTClient, DROP_OLDEST
+
+# Load environment variables from .env file if it exists
+load_dotenv()
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.StreamHandler(),
-        logging.FileHandler("/tmp/iot_simulator_v2.log")
-    ]
-)
+# Records are put on a queue and written to the console and log file by a QueueListener
+# thread, so the stream and file writes never run on the publishing thread.
+# LOG_LEVEL defaults to INFO like v1; the per-publish lines are DEBUG so the hot path stays quiet
+log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+log_handlers = [logging.StreamHandler(), logging.FileHandler("/tmp/iot_simulator_v2.log")]
+for handler in log_handlers:
+    handler.setFormatter(log_formatter)
+log_queue = queue.SimpleQueue()
+log_listener = QueueListener(log_queue, *log_handlers)
+# The QueueHandler is attached directly; basicConfig would give it a formatter of its own
+root_logger = logging.getLogger()
+root_logger.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+root_logger.addHandler(QueueHandler(log_queue))
+log_listener.start()
+# Flush whatever is still queued when the process exits
+atexit.register(log_listener.stop)
 logger = logging.getLogger("IoTSimulatorV2")
 
-# Load environment variables from .env file if it exists
-load_dotenv()
+# Imported after load_dotenv so SIMULATOR_BATCH_SIZE from .env applies
+from sensors import next_value
 
 # ----- Helper to retrieve secrets from AWS Secrets Manager -----
+@functools.lru_cache(maxsize=None)
+def get_secrets_client(region_name):
+    """Create the Secrets Manager client for a region once and share it across lookups"""
+    return boto3.session.Session(region_name=region_name).client("secretsmanager")
+
+@functools.lru_cache(maxsize=8)
 def get_secret(secret_name, region_name=None):
-    """Retrieve a secret from AWS Secrets Manager"""
+    """Retrieve a secret from AWS Secrets Manager (memoized for the life of the process)"""
     if not region_name:
         region_name = os.getenv("AWS_REGION", "us-east-1")
     
     try:
-        client = boto3.client("secretsmanager", region_name=region_name)
+        client = get_secrets_client(region_name)
         get_secret_value_response = client.get_secret_value(SecretId=secret_name)
         secret = get_secret_value_response["SecretString"]
         return json.loads(secret)
@@ -119,6 +144,8 @@ if not IOT_ENDPOINT:
     logger.error("IOT_ENDPOINT not set. Please set it in your environment or .env file.")
     sys.exit(1)
 
+ROOT_CA_URL = "https://www.amazontrust.com/repository/AmazonRootCA1.pem"
+
 # Try to locate AmazonRootCA1.pem or download it
 root_ca_locations = [
     os.getenv("ROOT_CA_PATH"),
@@ -138,37 +165,112 @@ for location in root_ca_locations:
 if not ROOT_CA_PATH:
     logger.warning("AmazonRootCA1.pem not found. Downloading it now...")
     try:
-        root_ca_content = requests.get("https://www.amazontrust.com/repository/AmazonRootCA1.pem").text
+        # urlopen raises on HTTP errors, so an error page is never written out as the CA
+        with urlopen(ROOT_CA_URL, timeout=10) as response:
+            root_ca_content = response.read().decode()
+        if not root_ca_content.startswith("-----BEGIN CERTIFICATE-----"):
+            raise ValueError("downloaded file is not a PEM certificate")
         os.makedirs("./certs", exist_ok=True)
-        with open("./certs/AmazonRootCA1.pem", "w") as f:
+        # Write to a temporary name first so an interrupted download never leaves a partial CA behind
+        with open("./certs/AmazonRootCA1.pem.tmp", "w") as f:
             f.write(root_ca_content)
+        os.replace("./certs/AmazonRootCA1.pem.tmp", "./certs/AmazonRootCA1.pem")
         ROOT_CA_PATH = "./certs/AmazonRootCA1.pem"
         logger.info(f"Downloaded AmazonRootCA1.pem to {ROOT_CA_PATH}")
     except Exception as e:
         logger.error(f"Failed to download AmazonRootCA1.pem: {str(e)}")
         sys.exit(1)
 
-# Get device ID from environment variable or use default
-DEVICE_ID_PREFIX = os.getenv("DEVICE_ID", "ems-monitoring-device")
+# ----- Resolved configuration -----
+@dataclass(frozen=True)
+class SimulatorConfig:
+    """Settings resolved once at startup; the client setup and simulators only read them."""
+    __slots__ = ("endpoint", "device_prefix", "root_ca", "certificate", "private_key",
+                 "keepalive", "ttl_seconds", "coalesce_window")
+    endpoint: str
+    device_prefix: str
+    root_ca: str
+    certificate: str
+    private_key: str
+    keepalive: int
+    ttl_seconds: int
+    coalesce_window: float
+
+CONFIG = SimulatorConfig(
+    endpoint=IOT_ENDPOINT,
+    # Get device ID from environment variable or use default
+    device_prefix=os.getenv("DEVICE_ID", "ems-monitoring-device"),
+    root_ca=ROOT_CA_PATH,
+    certificate=CERTIFICATE_PATH,
+    private_key=PRIVATE_KEY_PATH,
+    # MQTT keepalive; a longer interval means fewer PINGREQs on an otherwise quiet connection
+    keepalive=int(os.getenv("MQTT_KEEPALIVE_SECONDS", "300")),
+    # TTL for DynamoDB items (TTL_DAYS, default 30, in seconds)
+    ttl_seconds=int(os.getenv("TTL_DAYS", "30")) * 86400,
+    # Simulators due within this many seconds of each other publish in the same pass
+    coalesce_window=float(os.getenv("PUBLISH_COALESCE_SECONDS", "0.25")),
+)
+
+# ----- TCP keepalive on the MQTT connection -----
+# Idle NAT and firewall mappings can expire between readings; kernel keepalive probes keep
+# the connection's mapping alive without waking the process
+TCP_KEEPIDLE_SECONDS = 60
+# Seconds between unanswered probes, and how many go unanswered before the connection is dropped
+TCP_KEEPINTVL_SECONDS = 20
+TCP_KEEPCNT = 3
+# MQTT over TLS port of the IoT endpoint
+MQTT_PORT = 8883
+# Seconds allowed for the TCP connect and for the MQTT connect/disconnect handshake
+CONNECT_TIMEOUT_SECONDS = 20
+# Publishes held while disconnected; beyond this the oldest readings are dropped
+OFFLINE_QUEUE_SIZE = int(os.getenv("OFFLINE_QUEUE_SIZE", "1000"))
+
+def create_mqtt_socket():
+    """Open the TCP connection to the IoT endpoint with keepalive probes enabled (used on every reconnect)"""
+    sock = socket.create_connection((CONFIG.endpoint, MQTT_PORT), timeout=CONNECT_TIMEOUT_SECONDS)
+    # The timeout only bounds the connect; the SDK expects a blocking socket from here on
+    sock.settimeout(None)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+    # Probe timing options are only available on Linux
+    if hasattr(socket, "TCP_KEEPIDLE"):
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, TCP_KEEPIDLE_SECONDS)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, TCP_KEEPINTVL_SECONDS)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, TCP_KEEPCNT)
+    return sock
 
 # ----- Initialize the MQTT Client -----
-logger.info(f"Connecting to IoT endpoint: {IOT_ENDPOINT}")
-client = AWSIoTMQTTClient(f"{DEVICE_ID_PREFIX}-v2")
-client.configureEndpoint(IOT_ENDPOINT, 8883)
-client.configureCredentials(ROOT_CA_PATH, PRIVATE_KEY_PATH, CERTIFICATE_PATH)
-client.configureOfflinePublishQueueing(-1)
-client.configureDrainingFrequency(2)
-client.configureConnectDisconnectTimeout(10)
-client.configureMQTTOperationTimeout(5)
-
-# Connect with retry logic
+logger.info(f"Connecting to IoT endpoint: {CONFIG.endpoint}")
+client = AWSIoTMQTTClient(f"{CONFIG.device_prefix}-v2")
+client.configureEndpoint(CONFIG.endpoint, MQTT_PORT)
+client.configureCredentials(CONFIG.root_ca, CONFIG.private_key, CONFIG.certificate)
+# The SDK still wraps this socket in TLS with the credentials above
+client.configureSocketFactory(create_mqtt_socket)
+client.configureOfflinePublishQueueing(OFFLINE_QUEUE_SIZE, DROP_OLDEST)
+# Publishes made while reconnecting wait in the offline queue, so drain it quickly
+client.configureDrainingFrequency(10)
+client.configureConnectDisconnectTimeout(CONNECT_TIMEOUT_SECONDS)
+client.configureMQTTOperationTimeout(10)
+# Reconnect after 1 s, backing off to at most 16 s; 20 s connected counts as stable
+client.configureAutoReconnectBackoffTime(1, 16, 20)
+
+# Set by on_connack with the broker's return code once the CONNACK arrives
+connack_received = threading.Event()
+connack_rc = None
+
+def on_connack(mid, rc):
+    """Record the broker's answer to the asynchronous connect and wake the main thread"""
+    global connack_rc
+    connack_rc = rc
+    connack_received.set()
+
+# Connect with retry logic. connectAsync returns once the TLS connection is open without
+# waiting for the CONNACK, which is awaited below before any reading is published
 connected = False
 max_retries = 5
 for attempt in range(max_retries):
     try:
         logger.info(f"Connecting to AWS IoT Core, attempt {attempt+1}/{max_retries}")
-        connect_result = client.connect()
-        logger.info(f"Connection successful: {connect_result}")
+        client.connectAsync(keepAliveIntervalSecond=CONFIG.keepalive, ackCallback=on_connack)
         connected = True
         break
     except Exception as e:
@@ -182,189 +284,126 @@ if not connected:
     logger.error("Failed to connect to AWS IoT Core after maximum retries")
     sys.exit(1)
 
-# ------------------ Simulation Functions ------------------
-
-def simulate_building_main_panel():
-    """Main Service Panel Energy Meter (1-minute interval)"""
-    while True:
-        try:
-            # Get device ID from environment variable or use default
-            device_id = f"{DEVICE_ID_PREFIX}_building_main_panel"
-            
-            # Add TTL value for DynamoDB (current timestamp + 30 days in seconds)
-            ttl_value = calculate_ttl()
-            
-            data = {
-                "device_id": device_id,
-                "sensor_type": "building",
-                "edge_time_stamp": str(datetime.datetime.now()),
-                "building_total_energy_kwh": round(random.uniform(1000, 2000), 2),
-                "building_demand_kw": round(random.uniform(50, 150), 2),
-                "ttl": ttl_value
-            }
-            publish_with_retry("ems/building/main_panel", json.dumps(data), 1)
-            logger.info(f"Published building main panel data: {data['building_total_energy_kwh']} kWh, {data['building_demand_kw']} kW")
-            time.sleep(60)
-        except Exception as e:
-            logger.error(f"Error in building_main_panel simulation: {str(e)}")
-            time.sleep(60)  # Continue with next interval
-
-def simulate_gateway_health():
-    """Local Gateway/Controller Health (30-second interval)"""
-    while True:
-        data = {
-            "device_id": "local_gateway",
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "status": random.choice(["OK", "WARN", "ERROR"]),
-            "message": "Gateway health check"
-        }
-        client.publish("ems/building/gateway_health", json.dumps(data), 1)
-        print("Published gateway health data:", data)
-        time.sleep(30)
-
-def simulate_network_monitoring():
-    """Communication Network Monitoring (1-minute interval)"""
-    while True:
-        data = {
-            "device_id": "network_monitor",
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "latency_ms": random.randint(10, 100),
-            "packet_loss_percent": round(random.uniform(0, 5), 2)
-        }
-        client.publish("ems/building/network", json.dumps(data), 1)
-        print("Published network monitoring data:", data)
-        time.sleep(60)
-
-def simulate_unit_panel(unit_id):
-    """Unit Main Distribution Panel Sub-Meter (1-minute interval)"""
-    while True:
-        data = {
-            "device_id": f"unit_{unit_id}_panel",
-            "unit_id": unit_id,
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "sub_meter_energy_kwh": round(random.uniform(100, 200), 2),
-            "demand_kw": round(random.uniform(10, 50), 2)
-        }
-        topic = f"ems/unit/{unit_id}/panel"
-        client.publish(topic, json.dumps(data), 1)
-        print(f"Published unit {unit_id} panel data:", data)
-        time.sleep(60)
-
-def simulate_unit_hvac(unit_id):
-    """Mini-Split HVAC Systems (1-minute interval)"""
-    while True:
-        data = {
-            "device_id": f"unit_{unit_id}_hvac",
-            "unit_id": unit_id,
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "hvac_runtime_minutes": random.randint(0, 60),
-            "hvac_power_kw": round(random.uniform(0.5, 3.0), 2)
-        }
-        topic = f"ems/unit/{unit_id}/hvac"
-        client.publish(topic, json.dumps(data), 1)
-        print(f"Published unit {unit_id} HVAC data:", data)
-        time.sleep(60)
-
-def simulate_unit_dhw(unit_id):
-    """Electric Domestic Hot Water (DHW) Heater (5-minute interval)"""
-    while True:
-        data = {
-            "device_id": f"unit_{unit_id}_dhw",
-            "unit_id": unit_id,
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "energy_consumption_kwh": round(random.uniform(10, 50), 2),
-            "cycle_duration_minutes": random.randint(5, 30)
-        }
-        topic = f"ems/unit/{unit_id}/dhw"
-        client.publish(topic, json.dumps(data), 1)
-        print(f"Published unit {unit_id} DHW data:", data)
-        time.sleep(300)
-
-def simulate_unit_appliance(unit_id):
-    """Electric Appliance Circuits (1-minute interval)"""
-    while True:
-        data = {
-            "device_id": f"unit_{unit_id}_appliance",
-            "unit_id": unit_id,
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "appliance_energy_kwh": round(random.uniform(1, 5), 2)
-        }
-        topic = f"ems/unit/{unit_id}/appliance"
-        client.publish(topic, json.dumps(data), 1)
-        print(f"Published unit {unit_id} appliance data:", data)
-        time.sleep(60)
-
-def simulate_unit_space_temperature(unit_id, room):
-    """Space Temperature Monitoring for a specific room in a unit (5-minute interval)"""
-    while True:
-        data = {
-            "device_id": f"unit_{unit_id}_space_temp_{room}",
-            "unit_id": unit_id,
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "room": room,
-            "temperature_f": round(random.uniform(65, 75), 2)
-        }
-        topic = f"ems/unit/{unit_id}/space_temperature/{room}"
-        client.publish(topic, json.dumps(data), 1)
-        print(f"Published space temperature data for unit {unit_id} {room}:", data)
-        time.sleep(300)
-
-def simulate_common_lighting():
-    """Common Hallways LED Lighting Circuit (1-minute interval)"""
-    while True:
-        data = {
-            "device_id": "common_lighting",
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "lighting_energy_kwh": round(random.uniform(1, 5), 2)
-        }
-        client.publish("ems/common/lighting", json.dumps(data), 1)
-        print("Published common area lighting data:", data)
-        time.sleep(60)
-
-def simulate_occupancy_events():
-    """Occupancy sensor event-driven logging (immediate reporting)"""
-    while True:
-        data = {
-            "device_id": "occupancy_sensor",
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "event": "motion_detected"
-        }
-        client.publish("ems/common/occupancy/event", json.dumps(data), 1)
-        print("Published occupancy event:", data)
-        time.sleep(random.randint(10, 30))
-
-def simulate_occupancy_health():
-    """Occupancy sensor periodic health check (1-minute interval)"""
-    while True:
-        data = {
-            "device_id": "occupancy_sensor",
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "battery_level": random.randint(20, 100),
-            "status": random.choice(["OK", "LOW_BATTERY"])
-        }
-        client.publish("ems/common/occupancy/health", json.dumps(data), 1)
-        print("Published occupancy health check:", data)
-        time.sleep(60)
-
-def simulate_environmental():
-    """Environmental Sensors (5-minute interval)"""
-    while True:
-        data = {
-            "device_id": "environment_sensor",
-            "edge_time_stamp": str(datetime.datetime.now()),
-            "ambient_temp": round(random.uniform(65, 80), 1),
-            "humidity": round(random.uniform(30, 60), 1)
-        }
-        client.publish("ems/common/environment", json.dumps(data), 1)
-        print("Published environmental data:", data)
-        time.sleep(300)
-
-# ----- Helper for thread-safe publishing -----
+if not connack_received.wait(CONNECT_TIMEOUT_SECONDS):
+    logger.error(f"No CONNACK from AWS IoT Core within {CONNECT_TIMEOUT_SECONDS} seconds")
+    sys.exit(1)
+if connack_rc != 0:
+    logger.error(f"AWS IoT Core refused the connection (rc={connack_rc})")
+    sys.exit(1)
+logger.info("Connected to AWS IoT Core")
+
+# ------------------ Simulated Sensors ------------------
+# Every simulated sensor is one Spec row, and a single routine fills and serializes any of them:
+#   topic    - MQTT topic the readings are published on
+#   interval - seconds between readings, or the name of a sensors.py draw giving them
+#   payload  - payload fields in publish order; fixed values are set here, None marks a per-reading value
+#   fields   - payload key -> sensors.py draw filled on every reading
+#   ttl      - whether the reading carries a DynamoDB TTL
+Spec = namedtuple("Spec", "topic interval payload fields ttl")
+
+# isoformat(sep=" ") produces exactly the str(datetime) format already stored in
+# edge_time_stamp, without going through the generic str() conversion
+_now = datetime.datetime.now
+
+def build_specs(num_units):
+    """Build the Spec rows for the building, each of num_units units and the common areas"""
+    specs = [
+        # Main Service Panel Energy Meter (1-minute interval)
+        Spec("ems/building/main_panel", 60,
+             {"device_id": f"{CONFIG.device_prefix}_building_main_panel", "sensor_type": "building",
+              "edge_time_stamp": None, "building_total_energy_kwh": None, "building_demand_kw": None,
+              "ttl": None},
+             {"building_total_energy_kwh": "building_total_energy_kwh",
+              "building_demand_kw": "building_demand_kw"}, True),
+        # Local Gateway/Controller Health (30-second interval)
+        Spec("ems/building/gateway_health", 30,
+             {"device_id": "local_gateway", "edge_time_stamp": None, "status": None,
+              "message": "Gateway health check"},
+             {"status": "gateway_status"}, False),
+        # Communication Network Monitoring (1-minute interval)
+        Spec("ems/building/network", 60,
+             {"device_id": "network_monitor", "edge_time_stamp": None, "latency_ms": None,
+              "packet_loss_percent": None},
+             {"latency_ms": "latency_ms", "packet_loss_percent": "packet_loss_percent"}, False),
+    ]
+    
+    for unit_id in range(1, num_units + 1):
+        specs += [
+            # Unit Main Distribution Panel Sub-Meter (1-minute interval)
+            Spec(f"ems/unit/{unit_id}/panel", 60,
+                 {"device_id": f"unit_{unit_id}_panel", "unit_id": unit_id, "edge_time_stamp": None,
+                  "sub_meter_energy_kwh": None, "demand_kw": None},
+                 {"sub_meter_energy_kwh": "sub_meter_energy_kwh", "demand_kw": "demand_kw"}, False),
+            # Mini-Split HVAC Systems (1-minute interval)
+            Spec(f"ems/unit/{unit_id}/hvac", 60,
+                 {"device_id": f"unit_{unit_id}_hvac", "unit_id": unit_id, "edge_time_stamp": None,
+                  "hvac_runtime_minutes": None, "hvac_power_kw": None},
+                 {"hvac_runtime_minutes": "hvac_runtime_minutes", "hvac_power_kw": "hvac_power_kw"}, False),
+            # Electric Domestic Hot Water (DHW) Heater (5-minute interval)
+            Spec(f"ems/unit/{unit_id}/dhw", 300,
+                 {"device_id": f"unit_{unit_id}_dhw", "unit_id": unit_id, "edge_time_stamp": None,
+                  "energy_consumption_kwh": None, "cycle_duration_minutes": None},
+                 {"energy_consumption_kwh": "energy_consumption_kwh",
+                  "cycle_duration_minutes": "cycle_duration_minutes"}, False),
+            # Electric Appliance Circuits (1-minute interval)
+            Spec(f"ems/unit/{unit_id}/appliance", 60,
+                 {"device_id": f"unit_{unit_id}_appliance", "unit_id": unit_id, "edge_time_stamp": None,
+                  "appliance_energy_kwh": None},
+                 {"appliance_energy_kwh": "appliance_energy_kwh"}, False),
+        ]
+        # Space Temperature Monitoring for each room in the unit (5-minute interval)
+        for room in ["bedroom", "living_room", "kitchen"]:
+            specs.append(Spec(f"ems/unit/{unit_id}/space_temperature/{room}", 300,
+                              {"device_id": f"unit_{unit_id}_space_temp_{room}", "unit_id": unit_id,
+                               "edge_time_stamp": None, "room": room, "temperature_f": None},
+                              {"temperature_f": "temperature_f"}, False))
+    
+    specs += [
+        # Common Hallways LED Lighting Circuit (1-minute interval)
+        Spec("ems/common/lighting", 60,
+             {"device_id": "common_lighting", "edge_time_stamp": None, "lighting_energy_kwh": None},
+             {"lighting_energy_kwh": "lighting_energy_kwh"}, False),
+        # Occupancy sensor event-driven logging (every 10-30 seconds)
+        Spec("ems/common/occupancy/event", "occupancy_event_delay",
+             {"device_id": "occupancy_sensor", "edge_time_stamp": None, "event": "motion_detected"},
+             {}, False),
+        # Occupancy sensor periodic health check (1-minute interval)
+        Spec("ems/common/occupancy/health", 60,
+             {"device_id": "occupancy_sensor", "edge_time_stamp": None, "battery_level": None,
+              "status": None},
+             {"battery_level": "battery_level", "status": "occupancy_status"}, False),
+        # Environmental Sensors (5-minute interval)
+        Spec("ems/common/environment", 300,
+             {"device_id": "environment_sensor", "edge_time_stamp": None, "ambient_temp": None,
+              "humidity": None},
+             {"ambient_temp": "ambient_temp", "humidity": "humidity"}, False),
+    ]
+    return specs
+
+def fill_reading(spec, data):
+    """Write a new reading for spec into its payload dict and return the serialized message"""
+    data["edge_time_stamp"] = _now().isoformat(sep=" ")
+    for key, draw in spec.fields.items():
+        data[key] = next_value(draw)
+    if spec.ttl:
+        # Add TTL value for DynamoDB (current timestamp + TTL_DAYS in seconds)
+        data["ttl"] = int(time.time()) + CONFIG.ttl_seconds
+    return orjson.dumps(data)
+
+def next_interval(spec):
+    """Seconds until spec's next reading"""
+    if isinstance(spec.interval, str):
+        return next_value(spec.interval)
+    return spec.interval
+
+# ----- Helper for publishing from the scheduler -----
 def publish_with_retry(topic, message, qos=1, max_retries=3):
     """Publish a message with retry logic"""
     for attempt in range(max_retries):
         try:
-            result = client.publish(topic, message, qos)
+            # publishAsync hands the message to the MQTT client without waiting for the
+            # PUBACK, so one slow acknowledgement never holds up the other simulators
+            result = client.publishAsync(topic, message, qos)
             return result
         except Exception as e:
             logger.error(f"Publish attempt {attempt+1} failed for topic {topic}: {str(e)}")
@@ -374,11 +413,6 @@ def publish_with_retry(topic, message, qos=1, max_retries=3):
                 logger.error(f"Failed to publish to topic {topic} after maximum retries")
                 return False
 
-# ----- TTL helper function -----
-def calculate_ttl(days=30):
-    """Calculate TTL value for DynamoDB (current timestamp + specified days in seconds)"""
-    return int((datetime.datetime.now() + datetime.timedelta(days=days)).timestamp())
-
 # ----- Signal handler for graceful shutdown -----
 def signal_handler(sig, frame):
     """Handle graceful shutdown"""
@@ -391,52 +425,62 @@ def signal_handler(sig, frame):
 signal.signal(signal.SIGINT, signal_handler)
 signal.signal(signal.SIGTERM, signal_handler)
 
-# ------------------ Main Thread: Start Simulation Threads ------------------
+# ------------------ Main: Run the Simulated Sensors from One Scheduler ------------------
+
+def run_scheduler(specs):
+    """
+    Publish readings for every Spec from a single loop. The next due spec sits at the
+    top of a heap, so the loop sleeps exactly until it is due, publishes its reading
+    and reschedules it by its interval. Specs falling due within
+    CONFIG.coalesce_window of each other are handled in one pass and their messages
+    published back to back.
+    """
+    start = time.monotonic()
+    # Entries are (due time, index, spec, payload dict); the index breaks ties so nothing else is compared.
+    # Every spec is due immediately; the first pass publishes them all together
+    schedule = [(start, index, spec, dict(spec.payload)) for index, spec in enumerate(specs)]
+    heapq.heapify(schedule)
+    log_publishes = logger.isEnabledFor(logging.DEBUG)
+    
+    while True:
+        # The loop only wakes when a reading is due
+        delay = schedule[0][0] - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        
+        # Take every spec due in this tick before publishing anything
+        horizon = time.monotonic() + CONFIG.coalesce_window
+        batch = []
+        rescheduled = []
+        while schedule and schedule[0][0] <= horizon:
+            due, index, spec, data = heapq.heappop(schedule)
+            batch.append((spec.topic, fill_reading(spec, data)))
+            # Scheduling from the due time rather than the wake-up time keeps intervals from drifting
+            rescheduled.append((due + next_interval(spec), index, spec, data))
+        
+        # Queued back to back, the messages are flushed together by the MQTT client's
+        # network thread instead of one wake-up and socket write per sensor
+        for topic, message in batch:
+            publish_with_retry(topic, message, 1)
+            if log_publishes:
+                # Only the record is queued here; the QueueListener thread writes it out
+                logger.debug("Published %d bytes to %s", len(message), topic)
+        
+        for entry in rescheduled:
+            heapq.heappush(schedule, entry)
 
 def main():
     """Main function to start the simulation"""
-    threads = []
-    
-    # Building-Level Threads
-    threads.append(threading.Thread(target=simulate_building_main_panel))
-    threads.append(threading.Thread(target=simulate_gateway_health))
-    threads.append(threading.Thread(target=simulate_network_monitoring))
-
     # Get number of units from environment or use default
     num_units = int(os.getenv("NUM_UNITS", "4"))
     logger.info(f"Simulating {num_units} units")
     
-    # Unit-Level Threads
-    for unit_id in range(1, num_units + 1):
-        threads.append(threading.Thread(target=simulate_unit_panel, args=(unit_id,)))
-        threads.append(threading.Thread(target=simulate_unit_hvac, args=(unit_id,)))
-        threads.append(threading.Thread(target=simulate_unit_dhw, args=(unit_id,)))
-        threads.append(threading.Thread(target=simulate_unit_appliance, args=(unit_id,)))
-        for room in ["bedroom", "living_room", "kitchen"]:
-            threads.append(threading.Thread(target=simulate_unit_space_temperature, args=(unit_id, room)))
-
-    # Common Areas Threads
-    threads.append(threading.Thread(target=simulate_common_lighting))
-    threads.append(threading.Thread(target=simulate_occupancy_events))
-    threads.append(threading.Thread(target=simulate_occupancy_health))
-    threads.append(threading.Thread(target=simulate_environmental))
-
-    logger.info(f"Starting {len(threads)} simulation threads")
-    
-    # Start all threads as daemon threads
-    for t in threads:
-        t.daemon = True
-        t.start()
-        time.sleep(0.1)  # Small delay to avoid overwhelming the connection
-
-    # Log thread status
-    logger.info(f"All {len(threads)} threads started successfully")
+    specs = build_specs(num_units)
+    logger.info(f"Scheduling {len(specs)} simulated sensors")
     
-    # Keep the main thread alive while handling signals for graceful shutdown
+    # The scheduler runs on the main thread, where the signal handlers above also run
     try:
-        while True:
-            time.sleep(10)
-            logger.info("Simulator running - publishing data to AWS IoT Core")
+        run_scheduler(specs)
     except KeyboardInterrupt:
         logger.info("Stopping IoT simulator (keyboard interrupt)")
         client.disconnect()
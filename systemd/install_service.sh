@@ -29,6 +29,7 @@ fi
 # Copy necessary files to the installation directory
 echo "Copying project files to ${INSTALL_DIR}"
 cp "$PROJECT_DIR/simulate_iot_data_v2.py" "$INSTALL_DIR/"
+cp "$PROJECT_DIR/sensors.py" "$INSTALL_DIR/"
 cp "$PROJECT_DIR/.env" "$INSTALL_DIR/" 2>/dev/null || echo "No .env file found, will need to be created manually"
 
 # If certificates exist locally, copy them
@@ -37,6 +38,14 @@ if [ -d "$PROJECT_DIR/certs" ]; then
   cp -r "$PROJECT_DIR/certs/"* "$INSTALL_DIR/certs/" 2>/dev/null || echo "No certificate files found"
 fi
 
+# Fetch the Amazon root CA at install time so the service never downloads it on startup
+if [ ! -f "$INSTALL_DIR/certs/AmazonRootCA1.pem" ]; then
+  echo "Downloading AmazonRootCA1.pem"
+  mkdir -p "$INSTALL_DIR/certs"
+  curl -fsSL https://www.amazontrust.com/repository/AmazonRootCA1.pem -o "$INSTALL_DIR/certs/AmazonRootCA1.pem" \
+    || echo "Could not download AmazonRootCA1.pem, the simulator will retry on startup"
+fi
+
 # Install dependencies
 echo "Installing Python dependencies"
 pip3 install -r "$PROJECT_DIR/requirements.txt"
@@ -0,0 +1,110 @@
+###############################
+# Batched Publish Fan-out
+###############################
+
+# Simulators publishing with SIMULATOR_BATCH_PUBLISH=true send every sensor reading of a
+# tick in one message on ems/all; this rule and Lambda split it back into sensor_data items.
+
+# Package the fan-out handler straight from the repository
+data "archive_file" "batch_fanout" {
+  type        = "zip"
+  source_file = "${path.module}/lambda/batch_fanout.py"
+  output_path = "${path.module}/build/batch_fanout.zip"
+}
+
+# IAM Role for the Lambda that writes the individual readings
+resource "aws_iam_role" "batch_fanout_role" {
+  name = "batch_fanout_role"
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Action    = "sts:AssumeRole",
+      Effect    = "Allow",
+      Principal = { Service = "lambda.amazonaws.com" }
+    }]
+  })
+}
+
+resource "aws_iam_role_policy" "batch_fanout_policy" {
+  name = "batch_fanout_policy"
+  role = aws_iam_role.batch_fanout_role.id
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect   = "Allow",
+        Action   = [
+          "dynamodb:BatchWriteItem",
+          "dynamodb:PutItem"
+        ],
+        Resource = aws_dynamodb_table.sensor_data.arn
+      },
+      {
+        Effect   = "Allow",
+        Action   = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:PutLogEvents"
+        ],
+        Resource = "arn:aws:logs:${var.region}:*:*"
+      }
+    ]
+  })
+}
+
+resource "aws_lambda_function" "batch_fanout" {
+  function_name    = "ems_batch_fanout"
+  role             = aws_iam_role.batch_fanout_role.arn
+  handler          = "batch_fanout.handler"
+  runtime          = "python3.11"
+  timeout          = 30
+  filename         = data.archive_file.batch_fanout.output_path
+  source_code_hash = data.archive_file.batch_fanout.output_base64sha256
+
+  environment {
+    variables = {
+      SENSOR_TABLE = aws_dynamodb_table.sensor_data.name
+    }
+  }
+
+  tags = {
+    Name        = "EMS-Batch-Fanout"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+resource "aws_iot_topic_rule" "ems_batch_rule" {
+  name        = "EMSBatchToDynamoDB"
+  # Adds the same sensor_type (topic(1)) and aws_timestamp the per-topic rule writes
+  sql         = "SELECT *, topic(1) as sensor_type, timestamp() as aws_timestamp FROM 'ems/all'"
+  sql_version = "2016-03-23"
+  description = "Split batched sensor messages into individual DynamoDB items"
+  enabled     = true
+
+  lambda {
+    function_arn = aws_lambda_function.batch_fanout.arn
+  }
+
+  error_action {
+    cloudwatch_logs {
+      log_group_name = "iot-rule-errors"
+      role_arn       = aws_iam_role.iot_dynamodb_role.arn
+    }
+  }
+
+  tags = {
+    Name        = "EMS-IoT-Batch-Rule"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Allow the IoT rule to invoke the fan-out Lambda
+resource "aws_lambda_permission" "batch_fanout_iot" {
+  statement_id  = "AllowIoTInvoke"
+  action        = "lambda:InvokeFunction"
+  function_name = aws_lambda_function.batch_fanout.function_name
+  principal     = "iot.amazonaws.com"
+  source_arn    = aws_iot_topic_rule.ems_batch_rule.arn
+}
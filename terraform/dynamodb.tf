@@ -4,6 +4,10 @@ resource "aws_dynamodb_table" "sensor_data" {
   hash_key     = "sensor_type"      # Partition key: sensor type (e.g., building, hvac, etc.)
   range_key    = "edge_time_stamp"  # Sort key: timestamp
 
+  # Stream new readings to the hourly rollup Lambda
+  stream_enabled   = true
+  stream_view_type = "NEW_IMAGE"
+
   attribute {
     name = "sensor_type"
     type = "S"
@@ -50,4 +54,66 @@ resource "aws_dynamodb_table" "sensor_data" {
     Environment = var.environment
     Project     = var.project_name
   }
-}
\ No newline at end of file
+}
+
+# Hourly energy rollups maintained from the sensor_data stream (see hourly_rollup.tf)
+resource "aws_dynamodb_table" "sensor_data_hourly" {
+  name         = var.dynamodb_hourly_table_name
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "sensor_type"  # Partition key: sensor type, matching sensor_data
+  range_key    = "hour_bucket"  # Sort key: hour of the readings (YYYY-MM-DDTHH)
+
+  attribute {
+    name = "sensor_type"
+    type = "S"
+  }
+
+  attribute {
+    name = "hour_bucket"
+    type = "S"
+  }
+
+  # Rollups expire together with the newest reading they contain
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  server_side_encryption {
+    enabled = true
+  }
+
+  tags = {
+    Name        = "EMS-Sensor-Data-Hourly"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Readings already folded into sensor_data_hourly, so stream retries are idempotent (see hourly_rollup.tf)
+resource "aws_dynamodb_table" "sensor_data_rollup_applied" {
+  name         = var.dynamodb_rollup_applied_table_name
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "reading_id"  # Partition key: sensor_type#device_id#edge_time_stamp
+
+  attribute {
+    name = "reading_id"
+    type = "S"
+  }
+
+  # Markers only need to outlive the stream retention period
+  ttl {
+    attribute_name = "ttl"
+    enabled        = true
+  }
+
+  server_side_encryption {
+    enabled = true
+  }
+
+  tags = {
+    Name        = "EMS-Sensor-Data-Rollup-Applied"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
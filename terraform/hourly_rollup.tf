@@ -0,0 +1,127 @@
+###############################
+# Hourly Rollup Lambda
+###############################
+
+# Package the rollup handler straight from the repository
+data "archive_file" "hourly_rollup" {
+  type        = "zip"
+  source_file = "${path.module}/lambda/hourly_rollup.py"
+  output_path = "${path.module}/build/hourly_rollup.zip"
+}
+
+# IAM Role for the Lambda that folds stream records into hourly rollups
+resource "aws_iam_role" "hourly_rollup_role" {
+  name = "hourly_rollup_role"
+  assume_role_policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [{
+      Action    = "sts:AssumeRole",
+      Effect    = "Allow",
+      Principal = { Service = "lambda.amazonaws.com" }
+    }]
+  })
+}
+
+resource "aws_iam_role_policy" "hourly_rollup_policy" {
+  name = "hourly_rollup_policy"
+  role = aws_iam_role.hourly_rollup_role.id
+  policy = jsonencode({
+    Version = "2012-10-17",
+    Statement = [
+      {
+        Effect   = "Allow",
+        Action   = [
+          "dynamodb:GetRecords",
+          "dynamodb:GetShardIterator",
+          "dynamodb:DescribeStream",
+          "dynamodb:ListStreams"
+        ],
+        Resource = aws_dynamodb_table.sensor_data.stream_arn
+      },
+      {
+        Effect   = "Allow",
+        Action   = [
+          "dynamodb:UpdateItem"
+        ],
+        Resource = aws_dynamodb_table.sensor_data_hourly.arn
+      },
+      {
+        Effect   = "Allow",
+        Action   = [
+          "dynamodb:PutItem"
+        ],
+        Resource = aws_dynamodb_table.sensor_data_rollup_applied.arn
+      },
+      {
+        Effect   = "Allow",
+        Action   = [
+          "sqs:SendMessage"
+        ],
+        Resource = aws_sqs_queue.hourly_rollup_failures.arn
+      },
+      {
+        Effect   = "Allow",
+        Action   = [
+          "logs:CreateLogGroup",
+          "logs:CreateLogStream",
+          "logs:PutLogEvents"
+        ],
+        Resource = "arn:aws:logs:${var.region}:*:*"
+      }
+    ]
+  })
+}
+
+resource "aws_lambda_function" "hourly_rollup" {
+  function_name    = "ems_hourly_rollup"
+  role             = aws_iam_role.hourly_rollup_role.arn
+  handler          = "hourly_rollup.handler"
+  runtime          = "python3.11"
+  timeout          = 30
+  filename         = data.archive_file.hourly_rollup.output_path
+  source_code_hash = data.archive_file.hourly_rollup.output_base64sha256
+
+  environment {
+    variables = {
+      HOURLY_TABLE  = aws_dynamodb_table.sensor_data_hourly.name
+      APPLIED_TABLE = aws_dynamodb_table.sensor_data_rollup_applied.name
+    }
+  }
+
+  tags = {
+    Name        = "EMS-Hourly-Rollup"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+# Stream batches that still fail after the retries below are recorded here instead of blocking the shard
+resource "aws_sqs_queue" "hourly_rollup_failures" {
+  name                      = "ems-hourly-rollup-failures"
+  message_retention_seconds = 1209600  # 14 days, the SQS maximum
+
+  tags = {
+    Name        = "EMS-Hourly-Rollup-Failures"
+    Environment = var.environment
+    Project     = var.project_name
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "hourly_rollup" {
+  event_source_arn  = aws_dynamodb_table.sensor_data.stream_arn
+  function_name     = aws_lambda_function.hourly_rollup.arn
+  # Start from the oldest record still in the stream (24 hours); applied markers make replays safe
+  starting_position = "TRIM_HORIZON"
+  batch_size        = 100
+
+  # Split failing batches to isolate a bad record, give up after a few retries
+  # and send the failed batch's details to the queue above
+  bisect_batch_on_function_error = true
+  maximum_retry_attempts         = 5
+
+  destination_config {
+    on_failure {
+      destination_arn = aws_sqs_queue.hourly_rollup_failures.arn
+    }
+  }
+}
@@ -0,0 +1,47 @@
+"""
+terraform/lambda/batch_fanout.py
+
+Lambda handler that splits batched simulator messages published on ems/all into
+one sensor_data item per sensor reading. Like the per-topic rule, every item is keyed
+on sensor_type = topic(1) ("ems"), which the ems/all rule adds to the message, and
+carries the rule's aws_timestamp.
+"""
+
+import os
+import logging
+from decimal import Decimal
+
+import boto3
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+SENSOR_TABLE = os.environ.get("SENSOR_TABLE", "sensor_data")
+# Partition key of the per-topic rule (topic(1) of ems/<sensor>), used if the rule didn't add one
+DEFAULT_SENSOR_TYPE = "ems"
+
+table = boto3.resource("dynamodb").Table(SENSOR_TABLE)
+
+def to_item(reading):
+    """Convert a JSON reading into a DynamoDB item (floats become Decimal)."""
+    return {key: Decimal(str(value)) if isinstance(value, float) else value
+            for key, value in reading.items()}
+
+def handler(event, context):
+    """Write every reading of a batched {"ts": ..., "sensors": {...}} message as its own item."""
+    readings = event.get("sensors", {})
+    partition = event.get("sensor_type", DEFAULT_SENSOR_TYPE)
+    # Readings sharing an edge_time_stamp share a key; the last one wins, as with the per-topic rule
+    with table.batch_writer(overwrite_by_pkeys=["sensor_type", "edge_time_stamp"]) as batch:
+        for sensor, reading in readings.items():
+            item = to_item(reading)
+            item["sensor_type"] = partition
+            if "aws_timestamp" in event:
+                item["aws_timestamp"] = event["aws_timestamp"]
+            if "edge_time_stamp" not in item:
+                logger.warning("Skipping %s reading without edge_time_stamp", sensor)
+                continue
+            batch.put_item(Item=item)
+
+    logger.info("Wrote %d readings from batched message", len(readings))
+    return {"written": len(readings)}
@@ -0,0 +1,144 @@
+"""
+terraform/lambda/hourly_rollup.py
+
+Lambda handler that maintains hourly energy rollups from the sensor_data DynamoDB stream.
+Each inserted reading adds its energy/demand values and a count to the matching
+(sensor_type, hour_bucket) item, so the dashboard can read hourly averages
+without aggregating raw readings. Each reading is applied together with a marker
+item in APPLIED_TABLE, so redelivered stream records are never counted twice.
+"""
+
+import os
+import time
+import logging
+from decimal import Decimal
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+
+logger = logging.getLogger()
+logger.setLevel(logging.INFO)
+
+HOURLY_TABLE = os.environ.get("HOURLY_TABLE", "sensor_data_hourly")
+# Markers of readings already folded into a rollup, so stream batch retries don't count them twice
+APPLIED_TABLE = os.environ.get("APPLIED_TABLE", "sensor_data_rollup_applied")
+# Markers only need to outlive the 24 hour stream retention, after which a record can't be redelivered
+APPLIED_TTL_SECONDS = 2 * 24 * 3600
+# TransactWriteItems accepts 100 actions: up to 99 markers plus the rollup update
+MAX_READINGS_PER_TRANSACTION = 99
+# Reading attribute -> prefix of the *_sum / *_count attributes on the rollup item
+ROLLUP_FIELDS = {
+    "building_total_energy_kwh": "kwh",
+    "building_demand_kw": "kw",
+}
+
+dynamodb = boto3.resource("dynamodb")
+table = dynamodb.Table(HOURLY_TABLE)
+client = dynamodb.meta.client
+deserializer = TypeDeserializer()
+
+def hour_bucket(edge_time_stamp):
+    """Truncate an edge_time_stamp to its hour, e.g. '2024-01-01 13:05:00' -> '2024-01-01T13'."""
+    return edge_time_stamp[:13].replace(" ", "T")
+
+def reading_id(image):
+    """Identify a reading by (sensor_type, device_id, edge_time_stamp) for its applied marker."""
+    return f"{image['sensor_type']}#{image.get('device_id', '')}#{image['edge_time_stamp']}"
+
+def sum_readings(readings):
+    """Add up the record count and the *_sum / *_count values of a list of readings."""
+    rollup = {"record_count": Decimal(len(readings))}
+    for image in readings:
+        for field, prefix in ROLLUP_FIELDS.items():
+            if image.get(field) is not None:
+                rollup[f"{prefix}_sum"] = rollup.get(f"{prefix}_sum", Decimal(0)) + Decimal(str(image[field]))
+                rollup[f"{prefix}_count"] = rollup.get(f"{prefix}_count", Decimal(0)) + 1
+    return rollup
+
+def apply_readings(key, readings, marker_ttl):
+    """
+    Add readings to one rollup item in a single transaction that also writes each
+    reading's applied marker. A marker that already exists cancels the transaction;
+    those readings were counted by an earlier delivery, so they are dropped and the
+    rest retried. Returns the number of readings applied.
+    """
+    while readings:
+        rollup = sum_readings(readings)
+        names = {f"#{attr}": attr for attr in rollup}
+        values = {f":{attr}": value for attr, value in rollup.items()}
+        markers = [{
+            "Put": {
+                "TableName": APPLIED_TABLE,
+                "Item": {"reading_id": reading_id(image), "ttl": marker_ttl},
+                "ConditionExpression": "attribute_not_exists(reading_id)",
+            }
+        } for image in readings]
+        update = {
+            "Update": {
+                "TableName": HOURLY_TABLE,
+                "Key": {"sensor_type": key[0], "hour_bucket": key[1]},
+                "UpdateExpression": "ADD " + ", ".join(f"#{attr} :{attr}" for attr in rollup),
+                "ExpressionAttributeNames": names,
+                "ExpressionAttributeValues": values,
+            }
+        }
+        
+        try:
+            client.transact_write_items(TransactItems=markers + [update])
+            return len(readings)
+        except client.exceptions.TransactionCanceledException as e:
+            reasons = e.response.get("CancellationReasons", [])[:len(readings)]
+            duplicates = {i for i, reason in enumerate(reasons) if reason.get("Code") == "ConditionalCheckFailed"}
+            if not duplicates:
+                # Conflicts and throttling: fail the batch so Lambda retries it
+                raise
+            logger.info("Skipping %d readings already applied to %s", len(duplicates), key)
+            readings = [image for i, image in enumerate(readings) if i not in duplicates]
+    return 0
+
+def raise_ttl(key, ttl):
+    """Set the rollup's ttl to the newest reading's ttl, never moving it backwards."""
+    try:
+        table.update_item(
+            Key={"sensor_type": key[0], "hour_bucket": key[1]},
+            UpdateExpression="SET #ttl = :ttl",
+            ConditionExpression="attribute_not_exists(#ttl) OR #ttl < :ttl",
+            ExpressionAttributeNames={"#ttl": "ttl"},
+            ExpressionAttributeValues={":ttl": ttl},
+        )
+    except client.exceptions.ConditionalCheckFailedException:
+        pass
+
+def handler(event, context):
+    """
+    Fold a batch of stream records into the matching (sensor_type, hour_bucket) rollups.
+    Safe to retry: readings already applied by an earlier delivery are skipped.
+    """
+    groups = {}
+    for record in event.get("Records", []):
+        if record.get("eventName") != "INSERT":
+            continue
+        
+        image = {key: deserializer.deserialize(value)
+                 for key, value in record["dynamodb"]["NewImage"].items()}
+        if "sensor_type" not in image or "edge_time_stamp" not in image:
+            continue
+        
+        # Keyed by reading so a record delivered twice in one batch is only counted once
+        key = (image["sensor_type"], hour_bucket(image["edge_time_stamp"]))
+        groups.setdefault(key, {})[reading_id(image)] = image
+    
+    marker_ttl = int(time.time()) + APPLIED_TTL_SECONDS
+    applied = 0
+    for key, readings in groups.items():
+        readings = list(readings.values())
+        for i in range(0, len(readings), MAX_READINGS_PER_TRANSACTION):
+            applied += apply_readings(key, readings[i:i + MAX_READINGS_PER_TRANSACTION], marker_ttl)
+        
+        # Rollups expire with the newest reading they contain
+        ttls = [image["ttl"] for image in readings if "ttl" in image]
+        if ttls:
+            raise_ttl(key, max(ttls))
+    
+    logger.info("Applied %d readings to %d hourly rollups", applied, len(groups))
+    return {"updated": len(groups), "applied": applied}
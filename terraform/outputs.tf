@@ -19,4 +19,9 @@ output "certificate_arn" {
   description = "The IoT Certificate ARN"
   value       = aws_iot_certificate.ems_certificate.arn
   sensitive   = true
-}
\ No newline at end of file
+}
+
+output "dynamodb_hourly_table_name" {
+  description = "The DynamoDB table storing hourly sensor rollups"
+  value       = aws_dynamodb_table.sensor_data_hourly.name
+}
@@ -1,6 +1,7 @@
 resource "aws_iot_topic_rule" "ems_rule" {
   name        = "EMSDataToDynamoDB"
-  sql         = "SELECT *, topic(1) as sensor_type, timestamp() as aws_timestamp FROM 'ems/#'"
+  # Batched messages on ems/all are split by the fan-out Lambda (batch_fanout.tf) instead
+  sql         = "SELECT *, topic(1) as sensor_type, timestamp() as aws_timestamp FROM 'ems/#' WHERE topic(2) <> 'all'"
   sql_version = "2016-03-23"
   description = "Route messages from IoT sensors to DynamoDB"
   enabled     = true
@@ -22,6 +22,18 @@ variable "dynamodb_table_name" {
   default     = "sensor_data"  # Changed to match app.py and naming conventions
 }
 
+variable "dynamodb_hourly_table_name" {
+  description = "Name of the DynamoDB table storing hourly sensor rollups"
+  type        = string
+  default     = "sensor_data_hourly"
+}
+
+variable "dynamodb_rollup_applied_table_name" {
+  description = "Name of the DynamoDB table recording readings already added to the hourly rollups"
+  type        = string
+  default     = "sensor_data_rollup_applied"
+}
+
 variable "environment" {
   description = "Environment name (e.g., dev, staging, production)"
   type        = string